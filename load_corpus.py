@@ -14,7 +14,8 @@ if __name__ == '__main__':
     )    
     parser.add_argument('-s', 
                         nargs='+', 
-                        help="paths to files or to json config file", 
+                        help="paths to files (or to zip/tar archives, optionally followed by !pattern, " \
+                        "e.g. corpus.zip!texts/*.txt) or to json config file", 
                         required=True
                         )
     parser.add_argument('--json', 
@@ -45,8 +46,10 @@ if __name__ == '__main__':
                         )
     parser.add_argument('-n', 
                         action='store', 
-                        help="n grams lengths (default 1)", 
-                        default=1, 
+                        nargs='+',
+                        help="n grams lengths (default 1), or min and max lengths of a range, " \
+                        "extracted in a single pass (e.g. -n 2 4)", 
+                        default=[1], 
                         type=int)
     parser.add_argument('-k', 
                         action='store', 
@@ -62,9 +65,10 @@ if __name__ == '__main__':
                         )
     parser.add_argument('-x', 
                         action='store', 
-                        help="format (txt, xml, tei, or txm) WARNING: only txt is fully implemented",
+                        help="format (txt, xml, tei, txm, or jsonl and parquet, with one record per document, " \
+                        "with id, author, text, and optional lang) WARNING: only txt is fully implemented",
                         default="txt", 
-                        choices=["txt", "xml", "tei", 'txm']
+                        choices=["txt", "xml", "tei", 'txm', 'jsonl', 'parquet']
                         )
     parser.add_argument('--sampling', 
                         action='store_true', 
@@ -102,6 +106,13 @@ if __name__ == '__main__':
                         "instead of continuous sampling (default: false)",
                         default=False
                         )
+    parser.add_argument('--samples_seed', 
+                        action='store', 
+                        help="Seed for random sampling and for the selection of max_samples, "
+                        "for reproducible samples (default: not seeded)",
+                        default=None, 
+                        type=int
+                        )
     parser.add_argument('--keep_punct', 
                         action='store_true', 
                         help="whether to keep punctuation and caps (default is False)",
@@ -144,7 +155,34 @@ if __name__ == '__main__':
                         "to be retained (default is 0, meaning no culling)",
                         default=0, 
                         type=float)
+    parser.add_argument('--workers', 
+                        action="store",
+                        help="number of worker processes for texts loading and features extraction " \
+                        "(default is 1, -1 means all CPUs)",
+                        default=1, 
+                        type=int)
+    parser.add_argument('--cache_dir', 
+                        action="store",
+                        help="directory of an on-disk cache of loaded and normalised texts, " \
+                        "reused by later runs on the same files (default is no cache)",
+                        default=None)
+    parser.add_argument('--approx_vocab', 
+                        action="store",
+                        help="bounded-memory approximate selection of the k most frequent features, " \
+                        "keeping approx_vocab * k counters, with an exact recount of the candidates " \
+                        "(default is exact counting)",
+                        default=None, 
+                        type=int)
+    parser.add_argument('--hashing', 
+                        action="store",
+                        help="hash features into this number of buckets (hashing trick), " \
+                        "without computing a feature list (default is no hashing)",
+                        default=None, 
+                        type=int)
     args = parser.parse_args()
+    if len(args.n) > 2:
+        parser.error("-n takes one length, or the min and max lengths of a range")
+    n = args.n[0] if len(args.n) == 1 else args.n
 
     # Load feature list if provided
     my_feats = None
@@ -167,7 +205,7 @@ if __name__ == '__main__':
         config = Config.from_kwargs(
             data_paths=args.s,
             feats=args.t,
-            n=args.n,
+            n=n,
             k=args.k,
             freqsType=args.freqs,
             format=args.x,
@@ -177,13 +215,19 @@ if __name__ == '__main__':
             step=args.sample_step,
             max_samples=args.max_samples,
             samples_random=args.samples_random,
+            samples_seed=args.samples_seed,
             keep_punct=args.keep_punct,
             keep_sym=args.keep_sym,
             no_ascii=args.no_ascii,
             identify_lang=args.identify_lang,
             embedding=args.embedding,
             neighbouring_size=args.neighbouring_size,
-            culling=args.culling
+            culling=args.culling,
+            workers=args.workers,
+            load_workers=args.workers,
+            cache_dir=args.cache_dir,
+            approx_vocab=args.approx_vocab,
+            hashing=args.hashing
         )
     
     # Inject my_feats if provided
@@ -198,15 +242,17 @@ if __name__ == '__main__':
         feat_file = args.o + "_feats.json"
         corpus_file = args.o + ".csv"
     else:
-        feat_file = f"feature_list_{args.t}{args.n}grams{args.k}mf.json"
-        corpus_file = f"feats_tests_n{args.n}_k_{args.k}.csv"
+        n_str = "-".join(str(i) for i in args.n)
+        feat_file = f"feature_list_{args.t}{n_str}grams{args.k}mf.json"
+        corpus_file = f"feats_tests_n{n_str}_k_{args.k}.csv"
 
     # Save results
     print(".......saving results.......")
     
-    with open(feat_file, "w") as out:
-        out.write(json.dumps(my_feats, ensure_ascii=False, indent=0))
-        print(f"Features list saved to {feat_file}")
+    if my_feats is not None:
+        with open(feat_file, "w") as out:
+            out.write(json.dumps(my_feats, ensure_ascii=False, indent=0))
+            print(f"Features list saved to {feat_file}")
 
     # Save corpus
     corpus.to_csv(corpus_file)
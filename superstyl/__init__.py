@@ -1,4 +1,4 @@
-from superstyl.load import load_corpus
+from superstyl.load import load_corpus, load_corpus_iter, SparseCorpus
 from superstyl.svm import train_svm, plot_rolling, plot_coefficients
 from superstyl.config import (
     Config,
@@ -15,11 +15,13 @@ from superstyl.config import (
 __all__ = [
     # Main functions
     'load_corpus',
+    'load_corpus_iter',
     'load_corpus_with_config',
     'train_svm',
     'train_svm_with_config',
     'plot_rolling',
     'plot_coefficients',
+    'SparseCorpus',
     
     # Configuration classes
     'Config',
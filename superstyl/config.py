@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field, fields
-from typing import Optional, List, Any, Dict, Type, TypeVar
+from typing import Optional, List, Any, Dict, Type, TypeVar, Union
 import json
 
 
@@ -58,6 +58,7 @@ class SamplingConfig(BaseConfig):
     step: Optional[int] = None
     max_samples: Optional[int] = None
     random: bool = False
+    seed: Optional[int] = None
 
     def __post_init__(self):
         self.validate()
@@ -69,6 +70,8 @@ class SamplingConfig(BaseConfig):
             raise ValueError("Random sampling is not compatible with step.")
         if self.random and self.max_samples is None:
             raise ValueError("Random sampling needs max_samples.")
+        if self.seed is not None and (not isinstance(self.seed, int) or self.seed < 0):
+            raise ValueError("Sampling seed must be a non-negative integer.")
 
 
 @dataclass
@@ -78,7 +81,7 @@ class FeatureConfig(BaseConfig):
     """
     name: Optional[str] = None  # For multi-feature identification
     type: str = "words"
-    n: int = 1
+    n: Union[int, List[int]] = 1  # n-grams length, or [min, max] range of lengths
     k: int = 5000
     freq_type: str = "relative"
     feat_list: Optional[List] = None
@@ -86,6 +89,11 @@ class FeatureConfig(BaseConfig):
     embedding: Optional[str] = None
     neighbouring_size: int = 10
     culling: float = 0
+    workers: int = 1  # Worker processes for counting (-1 for all CPUs)
+    approx_vocab: Optional[int] = None  # Approximate top-k vocabulary with approx_vocab * k counters
+    approx_exact_pass: bool = True  # Recount exactly the approximate vocabulary candidates
+    hashing: Optional[int] = None  # Hash features into this number of buckets, without feature list
+    k_per_order: bool = True  # With a range of n, select the k most frequent features of each length
 
     VALID_TYPES = ["words", "chars", "affixes", "lemma", "pos", "met_line", "met_syll"]
     VALID_FREQ_TYPES = ["relative", "absolute", "binary"]
@@ -99,8 +107,23 @@ class FeatureConfig(BaseConfig):
             raise ValueError(f"Invalid feature type: {self.type}.")
         if self.freq_type not in self.VALID_FREQ_TYPES:
             raise ValueError(f"Invalid frequency type: {self.freq_type}.")
-        if self.n < 1:
+        if isinstance(self.n, (list, tuple)):
+            self.n = list(self.n)
+            if len(self.n) != 2 or not all(isinstance(i, int) for i in self.n) or not 1 <= self.n[0] <= self.n[1]:
+                raise ValueError("n range must be [min, max], with 1 <= min <= max.")
+            if self.type == "affixes":
+                raise ValueError("n ranges are not supported for affixes.")
+        elif self.n < 1:
             raise ValueError("n must be a positive integer.")
+        if self.workers < 1 and self.workers != -1:
+            raise ValueError("workers must be a positive integer, or -1 for all CPUs.")
+        if self.approx_vocab is not None and self.approx_vocab < 1:
+            raise ValueError("approx_vocab must be a positive integer.")
+        if self.hashing is not None:
+            if self.hashing < 1:
+                raise ValueError("hashing must be a positive number of buckets.")
+            if self.embedding or self.culling > 0:
+                raise ValueError("hashing is not compatible with embedding or culling.")
 
     def _load_feat_list_if_needed(self) -> None:
         """
@@ -129,8 +152,11 @@ class CorpusConfig(BaseConfig):
     paths: List[str] = field(default_factory=list)
     format: str = "txt"
     identify_lang: bool = False
+    sparse: bool = False  # Return a SparseCorpus instead of a dense DataFrame
+    workers: int = 1  # Worker processes for texts loading (-1 for all CPUs)
+    cache_dir: Optional[str] = None  # Directory of an on-disk cache of loaded and normalised texts
 
-    VALID_FORMATS = ["txt", "xml", "tei", "txm"]
+    VALID_FORMATS = ["txt", "xml", "tei", "txm", "jsonl", "parquet"]
 
     def __post_init__(self):
         self.validate()
@@ -138,6 +164,8 @@ class CorpusConfig(BaseConfig):
     def validate(self) -> None:
         if self.format not in self.VALID_FORMATS:
             raise ValueError(f"Invalid format: {self.format}.")
+        if self.workers < 1 and self.workers != -1:
+            raise ValueError("workers must be a positive integer, or -1 for all CPUs.")
 
 
 @dataclass
@@ -198,6 +226,9 @@ class Config(BaseConfig):
         'data_paths': ('corpus', 'paths', lambda x: x if isinstance(x, list) else [x]),
         'format': ('corpus', 'format', None),
         'identify_lang': ('corpus', 'identify_lang', None),
+        'sparse': ('corpus', 'sparse', None),
+        'load_workers': ('corpus', 'workers', None),
+        'cache_dir': ('corpus', 'cache_dir', None),
         
         # Features (single feature mode)
         'feats': ('features', 'type', None),
@@ -208,6 +239,11 @@ class Config(BaseConfig):
         'embedding': ('features', 'embedding', lambda x: x if x else None),
         'neighbouring_size': ('features', 'neighbouring_size', None),
         'culling': ('features', 'culling', None),
+        'workers': ('features', 'workers', None),
+        'approx_vocab': ('features', 'approx_vocab', None),
+        'approx_exact_pass': ('features', 'approx_exact_pass', None),
+        'hashing': ('features', 'hashing', None),
+        'k_per_order': ('features', 'k_per_order', None),
         
         # Sampling
         'sampling': ('sampling', 'enabled', None),
@@ -216,6 +252,7 @@ class Config(BaseConfig):
         'step': ('sampling', 'step', None),
         'max_samples': ('sampling', 'max_samples', None),
         'samples_random': ('sampling', 'random', None),
+        'samples_seed': ('sampling', 'seed', None),
         
         # Normalization
         'keep_punct': ('normalization', 'keep_punct', None),
@@ -314,6 +351,8 @@ class Config(BaseConfig):
                 sampling_data['size'] = sampling_data.pop('sample_size')
             if 'samples_random' in sampling_data:
                 sampling_data['random'] = sampling_data.pop('samples_random')
+            if 'samples_seed' in sampling_data:
+                sampling_data['seed'] = sampling_data.pop('samples_seed')
             if 'sample_step' in sampling_data:
                 sampling_data['step'] = sampling_data.pop('sample_step')
             if 'sample_units' in sampling_data:
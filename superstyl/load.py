@@ -1,19 +1,58 @@
 import superstyl.preproc.pipe as pipe
 import superstyl.preproc.features_extract as fex
-from superstyl.preproc.text_count import count_process
+from superstyl.preproc.text_count import count_matrix
 import superstyl.preproc.embedding as embed
-import tqdm
+from superstyl.preproc.archives import split_archive_path
 import pandas
-from typing import Optional, List, Tuple, Union
+import scipy.sparse
+from dataclasses import dataclass
+from typing import Optional, List, Iterator, Tuple, Union
 
 from superstyl.config import Config, FeatureConfig
 
 
+@dataclass
+class SparseCorpus:
+    """
+    Sparse document-term matrix, as returned by load_corpus when config.corpus.sparse is set.
+
+    Memory scales with the number of non-zero counts, instead of documents x features.
+    It can be passed directly to train_svm.
+    """
+    matrix: scipy.sparse.csr_matrix
+    features: List[str]
+    metadata: Optional[pandas.DataFrame] = None  # 'author' and 'lang' columns, indexed by document name
+
+    @property
+    def index(self) -> pandas.Index:
+        return self.metadata.index
+
+    def to_dataframe(self) -> pandas.DataFrame:
+        """
+        Convert to the dense DataFrame (metadata and features) returned by default by load_corpus.
+        """
+        feats_df = pandas.DataFrame(self.matrix.toarray(), index=self.metadata.index, columns=list(self.features))
+        return pandas.concat([self.metadata, feats_df], axis=1)
+
+
+def _select_k(feat_list: List, k: int) -> List:
+    """
+    Keep the k most frequent features (and the ones tied with the k-th).
+    """
+    if k > len(feat_list):
+        print(f"K limit ignored ({len(feat_list)} < {k})")
+        return feat_list
+    val = feat_list[k-1][1]
+    return [m for m in feat_list if m[1] >= val]
+
+
 def _load_single_feature(
     myTexts: List[dict],
     feat_config: FeatureConfig,
     use_provided_feat_list: bool = False,
-) -> Tuple[pandas.DataFrame, List]:
+    cache: Optional[fex.CountCache] = None,
+    sparse: bool = False,
+) -> Tuple[Union[pandas.DataFrame, SparseCorpus], List]:
     """
     Extract features for a single FeatureConfig.
     Internal function used by load_corpus.
@@ -22,7 +61,17 @@ def _load_single_feature(
         use_provided_feat_list: If True and feat_config.feat_list is provided,
             return that list instead of the computed one. Used for test sets
             to ensure same features as training set.
+        cache: Per-run count cache, shared between feature list and counts
+            extraction. A new one is created if None.
+        sparse: If True, return a SparseCorpus (without metadata) instead of
+            a DataFrame.
+
+    With feat_config.hashing, no feature list is computed, and None is
+    returned instead.
     """
+    if cache is None:
+        cache = fex.CountCache()
+
     feats = feat_config.type
     n = feat_config.n
     k = feat_config.k
@@ -31,6 +80,19 @@ def _load_single_feature(
     embedding = feat_config.embedding
     neighbouring_size = feat_config.neighbouring_size
     culling = feat_config.culling
+    workers = feat_config.workers
+    approx_capacity = feat_config.approx_vocab * k if feat_config.approx_vocab else None
+    # with an approximate vocabulary, full counts of documents are not kept, so that memory stays bounded
+    counts_cache = cache if provided_feat_list is None and approx_capacity is None else None
+
+    if feat_config.hashing:
+        print(f".......hashing features ({feats}, n={n}, {feat_config.hashing} buckets).......")
+        matrix = fex.get_hashed_counts(myTexts, feat_config.hashing, feats=feats, n=n, freqsType=freqsType,
+                                       workers=workers)
+        my_feats = [f"hash_{i}" for i in range(feat_config.hashing)]
+        if sparse:
+            return SparseCorpus(matrix=matrix, features=my_feats), None
+        return pandas.DataFrame(matrix.toarray(), index=[t["name"] for t in myTexts], columns=my_feats), None
 
     embeddedFreqs = False
     if embedding:
@@ -41,13 +103,30 @@ def _load_single_feature(
 
     print(f".......getting features ({feats}, n={n}).......")
 
-    if provided_feat_list is None:
-        feat_list = fex.get_feature_list(myTexts, feats=feats, n=n, freqsType=freqsType)
-        if k > len(feat_list):
-            print(f"K limit ignored ({len(feat_list)} < {k})")
-        else:
-            val = feat_list[k-1][1]
-            feat_list = [m for m in feat_list if m[1] >= val]
+    if counts_cache is not None and any("units" in t for t in myTexts):
+        # overlapping samples are counted incrementally, over the units of their documents
+        cache.count_windows(myTexts, feats=feats, n=n)
+
+    if provided_feat_list is None and isinstance(n, list) and feat_config.k_per_order:
+        # all lengths are counted in a single pass, then the k most frequent of each are kept
+        if approx_capacity is None:
+            cache.count_documents(myTexts, feats=feats, n=n, workers=workers)
+        feat_list = fex.merge_feature_lists([
+            _select_k(
+                fex.get_feature_list(myTexts, feats=feats, n=order, freqsType=freqsType, cache=cache,
+                                     workers=workers, approx_capacity=approx_capacity,
+                                     exact_pass=feat_config.approx_exact_pass),
+                k
+            )
+            for order in fex.ngram_orders(n)
+        ], freqsType)
+    elif provided_feat_list is None:
+        feat_list = _select_k(
+            fex.get_feature_list(myTexts, feats=feats, n=n, freqsType=freqsType, cache=cache,
+                                 workers=workers, approx_capacity=approx_capacity,
+                                 exact_pass=feat_config.approx_exact_pass),
+            k
+        )
     else:
         feat_list = provided_feat_list
 
@@ -56,7 +135,9 @@ def _load_single_feature(
     my_feats = [m[0] for m in feat_list]
     # Copy myTexts to avoid mutating original for multi-feature
     texts_copy = [dict(t) for t in myTexts]
-    texts_copy = fex.get_counts(texts_copy, feat_list=my_feats, feats=feats, n=n, freqsType=freqsType)
+    # with a provided feature list (or an approximate vocabulary), only its features are counted
+    texts_copy = fex.get_counts(texts_copy, feat_list=my_feats, feats=feats, n=n, freqsType=freqsType,
+                                cache=counts_cache, workers=workers)
 
     if embedding:
         print(".......embedding counts.......")
@@ -71,12 +152,13 @@ def _load_single_feature(
 
     print(".......feeding data frame.......")
 
-    loc = {}
-    for t in tqdm.tqdm(texts_copy):
-        text, local_freqs = count_process((t, my_feats), embeddedFreqs=embeddedFreqs)
-        loc[text["name"]] = local_freqs
+    matrix = count_matrix(texts_copy, my_feats, embeddedFreqs=embeddedFreqs)
 
-    feats_df = pandas.DataFrame.from_dict(loc, columns=list(my_feats), orient="index")
+    if sparse:
+        feats_df = SparseCorpus(matrix=matrix, features=list(my_feats))
+    else:
+        feats_df = pandas.DataFrame(matrix.toarray(), index=[t["name"] for t in texts_copy],
+                                    columns=list(my_feats))
 
     # For test sets: return the provided feat_list unchanged
     if use_provided_feat_list and provided_feat_list is not None:
@@ -85,11 +167,37 @@ def _load_single_feature(
     return feats_df, feat_list
 
 
+def _resolve_paths(config: Config) -> List[str]:
+    """
+    Expand config.corpus.paths, and check that feature types are consistent with the corpus.
+    """
+    data_paths = config.corpus.paths
+
+    # Handle string paths (single file, glob pattern, or archive with an inner glob pattern)
+    if isinstance(data_paths, str):
+        import glob
+        # If it's a glob pattern, expand it
+        if ('*' in data_paths or '?' in data_paths) and split_archive_path(data_paths) is None:
+            data_paths = sorted(glob.glob(data_paths))
+        else:
+            # Single file path - wrap in list
+            data_paths = [data_paths]
+
+    # Validate
+    for feat_config in config.features:
+        if feat_config.type in ('lemma', 'pos', 'met_line', 'met_syll') and config.corpus.format != 'tei':
+            raise ValueError(f"{feat_config.type} requires TEI format.")
+        if feat_config.type in ('met_line', 'met_syll') and config.sampling.units != 'verses':
+            raise ValueError(f"{feat_config.type} requires verses units.")
+
+    return data_paths
+
+
 def load_corpus(
     config: Optional[Config] = None,
     use_provided_feat_list: bool = False,
     **kwargs
-) -> Tuple[pandas.DataFrame, Union[List, List[List]]]:
+) -> Tuple[Union[pandas.DataFrame, SparseCorpus], Union[List, List[List]]]:
     """
     Load a corpus and extract features.
     
@@ -104,13 +212,17 @@ def load_corpus(
                                Use for test sets to match training features.
         **kwargs: Individual parameters for backward compatibility.
                   Supported: data_paths, feat_list, feats, n, k, freqsType,
-                  format, sampling, units, size, step, max_samples, samples_random,
+                  format, sampling, units, size, step, max_samples, samples_random, samples_seed,
                   keep_punct, keep_sym, no_ascii, identify_lang, embedding,
-                  neighbouring_size, culling
+                  neighbouring_size, culling, workers, approx_vocab,
+                  approx_exact_pass, hashing, k_per_order, sparse,
+                  load_workers, cache_dir
     
     Returns:
         - If single feature: (DataFrame, feat_list)
         - If multiple features: (DataFrame with prefixed columns, list of feat_lists)
+        With config.corpus.sparse, a SparseCorpus is returned instead of the DataFrame.
+        With hashing, the feat_list is None.
     """
     # Build config from kwargs if not provided
     if config is None:
@@ -118,42 +230,7 @@ def load_corpus(
     
     # Validate configuration
     config.validate()
-    data_paths = config.corpus.paths
-        
-    # Handle string paths (single file or glob pattern)
-    if isinstance(data_paths, str):
-        import glob
-        # If it's a glob pattern, expand it
-        if '*' in data_paths or '?' in data_paths:
-            data_paths = sorted(glob.glob(data_paths))
-        else:
-            # Single file path - wrap in list
-            data_paths = [data_paths]
-
-    # Validate
-    for feat_config in config.features:
-        if feat_config.type in ('lemma', 'pos', 'met_line', 'met_syll') and config.corpus.format != 'tei':
-            raise ValueError(f"{feat_config.type} requires TEI format.")
-        if feat_config.type in ('met_line', 'met_syll') and config.sampling.units != 'verses':
-            raise ValueError(f"{feat_config.type} verses lines units.")
-    data_paths = config.corpus.paths
-        
-    # Handle string paths (single file or glob pattern)
-    if isinstance(data_paths, str):
-        import glob
-        # If it's a glob pattern, expand it
-        if '*' in data_paths or '?' in data_paths:
-            data_paths = sorted(glob.glob(data_paths))
-        else:
-            # Single file path - wrap in list
-            data_paths = [data_paths]
-
-    # Validate
-    for feat_config in config.features:
-        if feat_config.type in ('lemma', 'pos', 'met_line', 'met_syll') and config.corpus.format != 'tei':
-            raise ValueError(f"{feat_config.type} requires TEI format.")
-        if feat_config.type in ('met_line', 'met_syll') and config.sampling.units != 'verses':
-            raise ValueError(f"{feat_config.type} requires verses units.")
+    data_paths = _resolve_paths(config)
 
     # Load texts once
     print(".......loading texts.......")
@@ -161,7 +238,8 @@ def load_corpus(
     if config.sampling.enabled:
         myTexts = pipe.docs_to_samples(
             data_paths,
-            config=config
+            config=config,
+            keep_units=True
         )
     else:
         myTexts = pipe.load_texts(
@@ -178,12 +256,21 @@ def load_corpus(
         data=[[t["aut"], t["lang"]] for t in myTexts]
     )
 
+    # Counts are shared between feature list and counts extraction,
+    # and between feature sets with the same type and n
+    cache = fex.CountCache()
+
+    sparse = config.corpus.sparse
+
     # Single feature case
     if len(config.features) == 1:
         feat_config = config.features[0]
         feats_df, feat_list = _load_single_feature(
-            myTexts, feat_config, use_provided_feat_list
+            pipe.layer_texts(myTexts, config, feat_config.type), feat_config, use_provided_feat_list, cache, sparse
         )
+        if sparse:
+            feats_df.metadata = metadata
+            return feats_df, feat_list
         corpus = pandas.concat([metadata, feats_df], axis=1)
         return corpus, feat_list
 
@@ -192,19 +279,132 @@ def load_corpus(
     
     all_feat_lists = []
     merged_feats = metadata.copy()
+    sparse_blocks = []
 
     for i, feat_config in enumerate(config.features):
         prefix = feat_config.name or f"f{i+1}"
         print(f".......processing {prefix}.......")
         
         feats_df, feat_list = _load_single_feature(
-            myTexts, feat_config, use_provided_feat_list
+            pipe.layer_texts(myTexts, config, feat_config.type), feat_config, use_provided_feat_list, cache, sparse
         )
-        
+        all_feat_lists.append(feat_list)
+
+        if sparse:
+            feats_df.features = [f"{prefix}_{col}" for col in feats_df.features]
+            sparse_blocks.append(feats_df)
+            continue
+
         # Prefix columns to avoid collisions
         feats_df = feats_df.rename(columns={col: f"{prefix}_{col}" for col in feats_df.columns})
         
         merged_feats = pandas.concat([merged_feats, feats_df], axis=1)
-        all_feat_lists.append(feat_list)
 
-    return merged_feats, all_feat_lists
\ No newline at end of file
+    if sparse:
+        merged_sparse = SparseCorpus(
+            matrix=scipy.sparse.hstack([b.matrix for b in sparse_blocks], format="csr"),
+            features=[f for b in sparse_blocks for f in b.features],
+            metadata=metadata
+        )
+        return merged_sparse, all_feat_lists
+
+    return merged_feats, all_feat_lists
+
+
+def load_corpus_iter(
+    config: Optional[Config] = None,
+    **kwargs
+) -> Tuple[Iterator[dict], Union[List, List[List]]]:
+    """
+    Load a corpus and extract features, streaming documents one by one, so that
+    texts are never held for the whole corpus at once.
+
+    Features without a feat_list (or hashing) are selected in a first pass over
+    the corpus, counting all feature sets at once. Documents are then loaded again,
+    and each one is vectorized and dropped.
+
+    Takes the same arguments as load_corpus, except for embedding and culling,
+    that need the counts of the whole corpus. Counting is serial, and
+    config.corpus.workers can be used to load texts in parallel.
+
+    Returns:
+        - A generator of documents, as dictionaries with 'name', 'aut', 'lang', and
+          'vector' (the features values, in the same order as the columns of
+          load_corpus; a 1 x n_features scipy.sparse matrix with config.corpus.sparse,
+          a numpy array otherwise)
+        - The feat_list, or the list of feat_lists with multiple features
+    """
+    if config is None:
+        config = Config.from_kwargs(**kwargs)
+
+    config.validate()
+    for feat_config in config.features:
+        if feat_config.embedding or feat_config.culling > 0:
+            raise ValueError("embedding and culling are not supported when streaming documents.")
+
+    data_paths = _resolve_paths(config)
+
+    # First pass, for the features to be selected
+    vocabularies = {
+        i: fex.VocabularyCounter(
+            feats=feat_config.type, n=feat_config.n, freqsType=feat_config.freq_type,
+            approx_capacity=feat_config.approx_vocab * feat_config.k if feat_config.approx_vocab else None
+        )
+        for i, feat_config in enumerate(config.features)
+        if feat_config.feat_list is None and not feat_config.hashing
+    }
+    if vocabularies:
+        print(".......getting features.......")
+        for document in pipe.iter_texts(data_paths, config=config):
+            for i, vocabulary in vocabularies.items():
+                vocabulary.update(pipe.layer_texts([document], config, config.features[i].type)[0]["text"])
+
+    feat_lists = []
+    for i, feat_config in enumerate(config.features):
+        if feat_config.hashing:
+            feat_lists.append(None)
+        elif i in vocabularies:
+            order_lists = vocabularies[i].feature_lists()
+            if isinstance(feat_config.n, list) and feat_config.k_per_order:
+                feat_lists.append(fex.merge_feature_lists([_select_k(order_list, feat_config.k)
+                                                           for order_list in order_lists], feat_config.freq_type))
+            else:
+                merged = sorted(fex.merge_feature_lists(order_lists, feat_config.freq_type), key=lambda f: f[1],
+                                reverse=True)
+                feat_lists.append(_select_k(merged, feat_config.k))
+        else:
+            feat_lists.append(feat_config.feat_list)
+
+    def documents():
+        feature_sets = [fex.FeatureSet([f[0] for f in feat_list]) if feat_list is not None else None
+                        for feat_list in feat_lists]
+        columns = [{f[0]: j for j, f in reversed(list(enumerate(feat_list)))} if feat_list is not None else None
+                   for feat_list in feat_lists]
+        for document in pipe.iter_texts(data_paths, config=config):
+            rows = []
+            for feat_config, feat_list, feature_set, feat_columns in zip(config.features, feat_lists, feature_sets,
+                                                                         columns):
+                # each feature is counted on its own annotation layer
+                layer_document = pipe.layer_texts([document], config, feat_config.type)[0]
+                if feat_config.hashing:
+                    rows.append(fex.get_hashed_counts([layer_document], feat_config.hashing, feats=feat_config.type,
+                                                      n=feat_config.n, freqsType=feat_config.freq_type))
+                else:
+                    counts = fex.get_counts([dict(layer_document)], feat_list=feature_set, feats=feat_config.type,
+                                            n=feat_config.n, freqsType=feat_config.freq_type)[0]["wordCounts"]
+                    row = scipy.sparse.csr_matrix(
+                        ([value for value in counts.values()], ([0] * len(counts), [feat_columns[f] for f in counts])),
+                        shape=(1, len(feat_list))
+                    )
+                    rows.append(row)
+            row = rows[0] if len(rows) == 1 else scipy.sparse.hstack(rows, format="csr")
+            yield {
+                "name": document["name"],
+                "aut": document["aut"],
+                "lang": document["lang"],
+                "vector": row if config.corpus.sparse else row.toarray()[0]
+            }
+
+    if len(config.features) == 1:
+        return documents(), feat_lists[0]
+    return documents(), feat_lists
@@ -0,0 +1,134 @@
+import fnmatch
+import io
+import os
+import tarfile
+import zipfile
+from typing import IO, List, Optional, Tuple
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class ArchiveMember(str):
+    """
+    Path of a file inside an archive, as 'archive!/member', so that document names and authors
+    are taken from the member name. Data is read only when the member is opened (see open_source).
+    """
+
+    def __new__(cls, archive: str, member: str, size: int, mtime: float, data: Optional[bytes] = None):
+        path = super().__new__(cls, f"{archive}!/{member}")
+        path.archive = archive
+        path.member = member
+        path.size = size
+        path.mtime = mtime
+        path.data = data
+        return path
+
+    def __reduce__(self):
+        return ArchiveMember, (self.archive, self.member, self.size, self.mtime, self.data)
+
+    def with_data(self) -> 'ArchiveMember':
+        """Copy of the member with its data, e.g. to be sent to another process."""
+        if self.data is not None:
+            return self
+        return ArchiveMember(self.archive, self.member, self.size, self.mtime, _read_member(self))
+
+
+def split_archive_path(path: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    :param path: a path, possibly to an archive, optionally followed by '!' (or '!/') and a glob pattern
+    on member names (e.g. 'corpus.tar.gz!texts/*.txt')
+    :return: the archive path and the pattern (None for all members), or None if path is not an archive
+    """
+    if isinstance(path, ArchiveMember):
+        return None
+    archive, _, pattern = path.partition("!")
+    if not archive.lower().endswith(ARCHIVE_SUFFIXES):
+        return None
+    return archive, pattern.lstrip("/") or None
+
+
+def list_members(archive: str, pattern: Optional[str] = None) -> List[ArchiveMember]:
+    """
+    List the files of an archive, in archive order, optionally matching a glob pattern.
+    """
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zip_file:
+            infos = [(info.filename, info.file_size, info.date_time) for info in zip_file.infolist()
+                     if not info.is_dir()]
+    else:
+        with tarfile.open(archive, "r:*") as tar_file:
+            infos = [(info.name, info.size, info.mtime) for info in tar_file.getmembers() if info.isfile()]
+
+    return [ArchiveMember(archive, name, size, mtime) for name, size, mtime in infos
+            if pattern is None or fnmatch.fnmatch(name, pattern)]
+
+
+def expand_archives(paths: List[str]) -> List[str]:
+    """
+    Replace archive paths (optionally with an inner glob pattern) by the paths of their members.
+    """
+    expanded = []
+    for path in paths:
+        archive = split_archive_path(path)
+        if archive is None:
+            expanded.append(path)
+        else:
+            expanded.extend(list_members(*archive))
+    return expanded
+
+
+# Archives opened in this process, to read members without reopening them,
+# by path, with their modification time
+_ZIP_FILES = {}
+_TAR_STREAMS = {}
+
+
+def _opened(opened: dict, archive: str, open_archive):
+    mtime = os.stat(archive).st_mtime_ns
+    if archive in opened and opened[archive][0] != mtime:
+        opened.pop(archive)[1].close()
+    if archive not in opened:
+        opened[archive] = (mtime, open_archive(archive))
+    return opened[archive][1]
+
+
+def _read_member(member: ArchiveMember) -> bytes:
+    if member.archive in _ZIP_FILES or zipfile.is_zipfile(member.archive):
+        return _opened(_ZIP_FILES, member.archive, zipfile.ZipFile).read(member.member)
+
+    # compressed tar files are read as streams, forward only: members are expected in archive order,
+    # and the archive is only reopened to read a member before the current one
+    for attempt in range(2):
+        if attempt == 1:
+            _TAR_STREAMS.pop(member.archive)[1].close()
+        tar_stream = _opened(_TAR_STREAMS, member.archive, lambda archive: tarfile.open(archive, "r|*"))
+        info = tar_stream.next()
+        while info is not None:
+            if info.name == member.member and info.isfile():
+                return tar_stream.extractfile(info).read()
+            info = tar_stream.next()
+    raise KeyError(f"{member.member} not found in {member.archive}")
+
+
+def open_source(path: str, binary: bool = False, encoding: Optional[str] = None) -> IO:
+    """
+    Open a file, or an archive member, for reading.
+    """
+    if isinstance(path, ArchiveMember):
+        data = path.data if path.data is not None else _read_member(path)
+        if binary:
+            return io.BytesIO(data)
+        return io.TextIOWrapper(io.BytesIO(data), encoding=encoding)
+    if binary:
+        return open(path, 'rb')
+    return open(path, 'r', encoding=encoding)
+
+
+def source_signature(path: str) -> Tuple[str, int, float]:
+    """
+    :return: absolute path, size and modification time of a file, or of an archive member
+    """
+    if isinstance(path, ArchiveMember):
+        return f"{os.path.abspath(path.archive)}!/{path.member}", path.size, os.stat(path.archive).st_mtime_ns
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Optional
+
+from superstyl.preproc.archives import source_signature
+
+
+class TextCache:
+    """
+    On-disk cache of loaded and normalised documents, as a SQLite blob store in a cache directory.
+
+    Entries are keyed by the file path, size and modification time, and by the loading options
+    (e.g. format, feature layer, normalisation), so that any change in these is a cache miss.
+    """
+
+    FILENAME = "superstyl_texts.sqlite"
+    VERSION = 2  # to be incremented when loading output changes
+
+    def __init__(self, cache_dir: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, self.FILENAME)
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS texts (key TEXT PRIMARY KEY, value BLOB)")
+
+    def key(self, path: str, options: Dict[str, Any]) -> str:
+        """
+        Key of a document (or archive member), from its path, size and modification time,
+        and the loading options.
+        """
+        path, size, mtime = source_signature(path)
+        description = {
+            "version": self.VERSION,
+            "path": path,
+            "size": size,
+            "mtime": mtime,
+            "options": options
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.connection.execute("SELECT value FROM texts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        # other sequences (e.g. sample windows) are stored as lists
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO texts (key, value) VALUES (?, ?)",
+                                    (key, json.dumps(value, default=list).encode("utf-8")))
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,9 +1,58 @@
 # first line only necessary for older Python versions
 from builtins import sum
 from collections import Counter
-import nltk.tokenize
-import nltk
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import os
+import numpy
 import regex as re
+from sklearn.feature_extraction import FeatureHasher
+
+from superstyl.preproc.utils import normalize_whitespace, wordpunct_tokenize
+
+def count_features_args_check(text, feats, n):
+    if not isinstance(text, str):
+        raise ValueError("Text must be a string.")
+    if not text:
+        raise ValueError("Text cannot be empty.")
+    if n < 1 or not isinstance(n, int):
+        raise ValueError("n must be a positive integer.")
+    if feats not in ["words", "chars", "affixes", "lemma", "pos", "met_line", "met_syll"]:
+        raise ValueError("Unsupported feature type. Choose from 'words', 'chars', 'affixes', 'met_line', 'met_syll', 'lemma' or 'pos'.")
+
+
+# Token n-grams are counted as packed integer keys, rather than as strings, in texts of at least PACKED_MIN_TOKENS
+# tokens, with each distinct token occurring at least PACKED_MIN_REPEATS times on average (e.g. POS tags):
+# otherwise, n-grams strings are mostly distinct, and joining them all and counting them is faster
+PACKED_MIN_TOKENS = 100000
+PACKED_MIN_REPEATS = 1000
+
+# Maximal number of texts in a chunk counted by a worker process, with their results sent back at once
+CHUNK_TEXTS = 64
+
+
+def tokenize(text, feats="words"):
+    """
+    Split a text into tokens: verse lines (split on whitespace) for 'met_line', words and punctuation otherwise
+    """
+    if feats == "met_line":
+        return text.split()
+    return wordpunct_tokenize(text)
+
+
+def token_ids(tokens, distinct=None):
+    """
+    :param tokens: a list of tokens
+    :param distinct: the distinct tokens, in order of first occurrence, if already known
+    :return: their ids, numbered from 0 in order of first occurrence, as a numpy int32 array,
+    and the number of distinct tokens
+    """
+    if distinct is None:
+        distinct = dict.fromkeys(tokens)
+    ids = dict(zip(distinct, range(len(distinct))))
+    return numpy.fromiter(map(ids.__getitem__, tokens), dtype=numpy.int32, count=len(tokens)), len(ids)
+
 
 def count_features(text, feats ="words", n = 1):
     """
@@ -14,43 +63,15 @@ def count_features(text, feats ="words", n = 1):
     :param n: the length of n-grams
     :return: features absolute frequencies in text as a counter, and the total of frequencies
     """
-    if not isinstance(text, str):
-        raise ValueError("Text must be a string.")
-    if not text:
-        raise ValueError("Text cannot be empty.")
-    if n < 1 or not isinstance(n, int):
-        raise ValueError("n must be a positive integer.")
-    if feats not in ["words", "chars", "affixes", "lemma", "pos", "met_line", "met_syll"]:
-        raise ValueError("Unsupported feature type. Choose from 'words', 'chars', 'affixes', 'met_line', 'met_syll', 'lemma' or 'pos'.")
-    if feats in ("words", "lemma", "pos"):
-        tokens = nltk.tokenize.wordpunct_tokenize(text)
-        if n > 1:
-            tokens = ["_".join(t) for t in list(nltk.ngrams(tokens, n))]
-        total = len(tokens)
+    count_features_args_check(text, feats, n)
+    if feats in ("words", "lemma", "pos", "met_line"):
+        return count_token_ngrams_orders(tokenize(text, feats), [n])[0]
 
     elif feats in ["chars", "met_syll"]:
-        tokens = [re.sub(r'\p{Z}', '_', ''.join(ngram)) for ngram in nltk.ngrams(text, n)]
-        total = len(tokens)
+        return count_char_ngrams(re.sub(r'\p{Z}', '_', text), n)
 
     elif feats == "affixes":
-        words = nltk.tokenize.wordpunct_tokenize(text)
-        ngrams = [''.join(ngram) for ngram in nltk.ngrams(text, n)]
-        # relative frequencies should be computed from all existing n-grams
-        total = len(ngrams)
-        # and now get all types from Sapkota et al.
-        affs = [w[:3] for w in words if len(w) > n] + [w[-3:] for w in words if len(w) > n]
-        # space affixes (and punct affixes if keep_punct has been enabled)
-        space_affs_and_punct = [re.sub(r'\p{Z}', '_', ngram)
-                                for ngram in ngrams
-                                if re.search(r'(^\p{Z})|(\p{Z}$)|(\p{P})', ngram)
-                                ]
-        tokens = affs + space_affs_and_punct
-
-    elif feats == "met_line":
-        tokens = text.split()
-        if n > 1:
-            tokens = ["_".join(t) for t in list(nltk.ngrams(tokens, n))]
-        total = len(tokens)
+        return count_affixes(text, n)
 
     # Adding sentence length ; still commented as it is a work in progress, an integer won't do, a quantile would be better
     #elif feats == "sentenceLength":
@@ -61,11 +82,593 @@ def count_features(text, feats ="words", n = 1):
     else:
         raise ValueError("Unsupported feature type. Choose from 'words', 'chars', 'affixes', 'met_line', 'met_syll', 'lemmas' or 'pos'.")
 
+
+def ngram_orders(n):
+    """
+    :param n: the length of n-grams, or a [min, max] range of lengths
+    :return: the list of n-grams lengths
+    """
+    if isinstance(n, (list, tuple)):
+        return list(range(n[0], n[1] + 1))
+    return [n]
+
+
+def count_features_orders(text, feats="words", ns=(1,)):
+    """
+    Get feature counts from a text for several n-grams lengths, in a single pass over its tokens or characters
+    :param text: the source text
+    :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
+    :param ns: the lengths of n-grams
+    :return: a list with, for each length, features absolute frequencies as a counter, and the total of frequencies
+    """
+    if len(ns) == 1 or feats not in ("words", "lemma", "pos", "met_line", "chars", "met_syll"):
+        return [count_features(text, feats=feats, n=n) for n in ns]
+
+    # validation of arguments
+    for n in ns:
+        count_features_args_check(text, feats, n)
+
+    if feats in ("chars", "met_syll"):
+        return count_char_ngrams_orders(re.sub(r'\p{Z}', '_', text), ns)
+
+    return count_token_ngrams_orders(tokenize(text, feats), ns)
+
+
+def count_windows(tokens, windows, n=1):
+    """
+    Count the n-grams of (possibly overlapping) windows over a list of tokens, incrementally: the counts of each
+    window are made from the previous ones, adding the n-grams entering it and removing the ones leaving it,
+    so that counting is linear in the number of tokens, not in the number of windows times their size
+    :param tokens: the tokens (e.g. words) of a document
+    :param windows: (start, end) offsets of the windows in tokens, preferably by increasing start and end
+    :param n: the length of n-grams
+    :return: for each window, n-grams absolute frequencies as a counter, and the total of frequencies,
+    as count_features on the window tokens
+    """
+    ngrams = tokens if n == 1 else _join_ngrams(tokens, n)
     counts = Counter()
-    counts.update(tokens)
+    # the n-grams in counts, as ngrams[start:end]
+    start = end = 0
+    results = []
+    for window_start, window_end in windows:
+        # n-grams starting in the window, and ending in it
+        window_end = max(window_start, window_end - n + 1)
+        if window_start < start or window_end < end or window_start >= end:
+            counts = Counter(ngrams[window_start:window_end])
+        else:
+            # entering n-grams are added first, so that the ones still in the window keep their place
+            for ngram in ngrams[end:window_end]:
+                counts[ngram] += 1
+            for ngram in ngrams[start:window_start]:
+                remaining = counts[ngram] - 1
+                if remaining:
+                    counts[ngram] = remaining
+                else:
+                    del counts[ngram]
+        start, end = window_start, window_end
+        results.append((counts.copy(), window_end - window_start))
+    return results
+
+
+def document_text(document):
+    """
+    Text of a document, made from its window over the normalised units of its document (see pipe.docs_to_samples)
+    for samples whose text has been left out
+    """
+    if document["text"] is None:
+        return normalize_whitespace(" ".join(document["units"]))
+    return document["text"]
+
+
+class DocumentTexts(Sequence):
+    """
+    Texts of a list of documents (see document_text), only made when accessed
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
 
+    def __len__(self):
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [document_text(document) for document in self.documents[index]]
+        return document_text(self.documents[index])
+
+
+class CountCache:
+    """
+    Per-run cache of count_features results, keyed by document and by (feats, n), so that
+    vocabulary building (get_feature_list) and per-document counting (get_counts) share
+    a single tokenization pass.
+    Documents are keyed by their text, or by their window over the units of their document for samples
+    (see count_windows), so that the texts of samples are not kept.
+    The cached counters are shared, and must not be modified by the caller.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        # windows of the keys, so that the ids in keys are not reused
+        self._windows = {}
+
+    def key(self, document):
+        """
+        :return: the key of a document, its window over the units of its document (as (units, start, size)
+        for overlapping samples), or its text
+        """
+        window = document.get("units")
+        if window is None:
+            return document["text"]
+        key = window.key()
+        self._windows.setdefault(key, window)
+        return key
+
+    def count_features(self, text, feats="words", n=1):
+        """
+        Same as count_features, but computed only once for a given text, feats and n
+        :return: features absolute frequencies in text as a counter, and the total of frequencies
+        """
+        key = (feats, n, text)
+        if key not in self._counts:
+            self._counts[key] = count_features(text, feats=feats, n=n)
+        return self._counts[key]
+
+    def count_many(self, texts, feats="words", n=1, workers=1):
+        """
+        Same as count_features_many, filling the cache with the texts not already counted
+        (for a range of n, all lengths are counted in a single pass)
+        :return: a list of (counts, total), or of lists of them for a range of n, in the same order as texts
+        """
+        return self.count_documents([{"text": text} for text in texts], feats=feats, n=n, workers=workers)
+
+    def count_documents(self, documents, feats="words", n=1, workers=1):
+        """
+        Same as count_many, for documents (see key), with texts only made for the ones not already counted
+        :return: a list of (counts, total), or of lists of them for a range of n, in the same order as documents
+        """
+        ns = ngram_orders(n)
+        keys = [self.key(document) for document in documents]
+        missing = {}
+        for key, document in zip(keys, documents):
+            if key not in missing and any((feats, order, key) not in self._counts for order in ns):
+                missing[key] = document
+        for key, results in zip(missing, count_features_many(DocumentTexts(list(missing.values())), feats=feats,
+                                                             n=ns, workers=workers)):
+            for order, result in zip(ns, results):
+                self._counts[(feats, order, key)] = result
+        if isinstance(n, (list, tuple)):
+            return [[self._counts[(feats, order, key)] for order in ns] for key in keys]
+        return [self._counts[(feats, n, key)] for key in keys]
+
+    def count_windows(self, documents, feats="words", n=1):
+        """
+        Fill the cache for documents that are windows over the normalised units of documents (e.g. the overlapping
+        or random samples of docs_to_samples), tokenizing the units of each document once: windows are counted
+        with count_windows, and random samples (for single tokens) from the number of times each unit was drawn.
+        Only for features made of tokens ('words', 'lemma', 'pos' and 'met_line'), other documents (or documents
+        without a window) are left to count_documents
+        :param documents: the documents, with, as units, None or a window over the units of their document,
+        with tokens (the units, shared by the windows of the document) and start and end attributes,
+        as pipe.TokenWindow, or with indices and multiplicities, as pipe.TokenSample. Their text, if any,
+        is their units joined by spaces
+        """
+        if feats not in ("words", "lemma", "pos", "met_line"):
+            return
+        groups = {}
+        for document in documents:
+            window = document.get("units")
+            # empty texts are left to count_features, to raise its error
+            if window is not None and any(window):
+                groups.setdefault(id(window.tokens), (window.tokens, []))[1].append((self.key(document), window))
+
+        for units, members in groups.values():
+            # units in no window may be left as None
+            unit_tokens = [[] if unit is None else tokenize(unit, feats) for unit in units]
+            samples = [(key, window) for key, window in members if hasattr(window, "indices")]
+            members = [(key, window) for key, window in members if not hasattr(window, "indices")]
+
+            # n-grams of random samples span units in the order they were drawn, only single tokens are counted here
+            for key, sample in (samples if 1 in ngram_orders(n) else []):
+                counts = Counter()
+                total = 0
+                for unit, multiplicity in zip(*sample.multiplicities()):
+                    for token in unit_tokens[unit]:
+                        counts[token] += int(multiplicity)
+                    total += len(unit_tokens[unit]) * int(multiplicity)
+                self._counts.setdefault((feats, 1, key), (counts, total))
+
+            if members:
+                # tokens of the units, and the offsets of the units in them
+                tokens = [token for tokens in unit_tokens for token in tokens]
+                offsets = numpy.cumsum([0] + [len(tokens) for tokens in unit_tokens]).tolist()
+                token_windows = [(offsets[window.start], offsets[window.end]) for _, window in members]
+                for order in ngram_orders(n):
+                    for (key, _), result in zip(members, count_windows(tokens, token_windows, n=order)):
+                        self._counts.setdefault((feats, order, key), result)
+
+    def clear(self):
+        self._counts.clear()
+        self._windows.clear()
+
+
+def _count_chunk(texts, feats, n):
+    if isinstance(n, (list, tuple)):
+        return [count_features_orders(text, feats=feats, ns=n) for text in texts]
+    return [count_features(text, feats=feats, n=n) for text in texts]
+
+
+def _count_chunk_merged(texts, feats, n):
+    merged = Counter()
+    total = 0
+    for text in texts:
+        counts, text_total = count_features(text, feats=feats, n=n)
+        merged.update(counts)
+        total = total + text_total
+    return merged, total
+
+
+def _map_chunks(func, texts, feats, n, workers, *args):
+    """
+    Apply func to chunks of texts (and feats, n and args) over a process pool, yielding results in chunks order.
+    Chunks (of at most CHUNK_TEXTS texts) are submitted by windows of a few chunks per worker, so that only
+    a few results are held at once, as pipe._iter_paths does with paths
+    """
+    if workers == -1:
+        workers = os.cpu_count() or 1
+    chunk_size = min(max(1, -(-len(texts) // (workers * 4))), CHUNK_TEXTS)
+    window = workers * 4 * chunk_size
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(texts), window):
+            chunks = [texts[j:j + chunk_size] for j in range(i, min(i + window, len(texts)), chunk_size)]
+            yield from executor.map(func, chunks, *[[arg] * len(chunks) for arg in (feats, n) + args])
+
+
+def count_features_many(texts, feats="words", n=1, workers=1):
+    """
+    Get feature counts for several texts, with the same output as count_features,
+    possibly spread over a process pool
+    :param texts: a list of source texts
+    :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
+    :param n: the length of n-grams, or a list of lengths
+    :param workers: number of worker processes (1 for serial, -1 for all CPUs)
+    :return: an iterator over (counts, total), or over lists of them for a list of lengths,
+    in the same order as texts
+    """
+    if workers == 1 or len(texts) < 2:
+        yield from _count_chunk(texts, feats, n)
+    else:
+        for chunk in _map_chunks(_count_chunk, texts, feats, n, workers):
+            yield from chunk
+
+
+def _count_documents(myTexts, feats="words", n=1, cache=None, workers=1):
+    if cache is None:
+        return count_features_many(DocumentTexts(myTexts), feats=feats, n=n, workers=workers)
+    return cache.count_documents(myTexts, feats=feats, n=n, workers=workers)
+
+class FeatureSet:
+    """
+    A frozen list of features, prepared for restricted counting (count_features_restricted)
+    """
+
+    def __init__(self, feat_list):
+        self.feats = set(feat_list)
+        # possible first tokens of word n-grams (tokens may themselves contain '_')
+        self.first_tokens = {f[:i] for f in self.feats for i in range(1, len(f) + 1) if i == len(f) or f[i] == "_"}
+        self._codes = {}
+
+    def __contains__(self, feat):
+        return feat in self.feats
+
+    def __len__(self):
+        return len(self.feats)
+
+    def char_codes(self, n):
+        """
+        :return: the features of length n, and an array of their code points (one row per feature)
+        """
+        if n not in self._codes:
+            feats = sorted(f for f in self.feats if len(f) == n)
+            codes = numpy.frombuffer("".join(feats).encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+            self._codes[n] = (feats, codes.reshape(len(feats), n))
+        return self._codes[n]
+
+
+def _count_char_ngrams_restricted(text, n, feature_set):
+    total = max(len(text) - n + 1, 0)
+    feats, feat_codes = feature_set.char_codes(n)
+    if total == 0 or not feats:
+        return Counter(), total
+
+    codes = numpy.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+    alphabet, ids = numpy.unique(codes, return_inverse=True)
+    if len(alphabet) ** n >= 2 ** 63:
+        counts, total = count_char_ngrams(text, n)
+        return Counter({f: c for f, c in counts.items() if f in feature_set}), total
+
+    # features are encoded with the alphabet of the text, and can only occur if all their chars are in it
+    feat_ids = numpy.minimum(numpy.searchsorted(alphabet, feat_codes), len(alphabet) - 1)
+    possible = numpy.flatnonzero((alphabet[feat_ids] == feat_codes).all(axis=1))
+    if len(possible) == 0:
+        return Counter(), total
+
+    keys = numpy.zeros(total, dtype=numpy.int64)
+    feat_keys = numpy.zeros(len(possible), dtype=numpy.int64)
+    for i in range(n):
+        keys = keys * len(alphabet) + ids[i:total + i]
+        feat_keys = feat_keys * len(alphabet) + feat_ids[possible, i]
+
+    unique_keys, freqs = numpy.unique(keys, return_counts=True)
+    _, text_idx, feat_idx = numpy.intersect1d(unique_keys, feat_keys, assume_unique=True, return_indices=True)
+    counts = Counter({feats[possible[j]]: freq for j, freq in zip(feat_idx.tolist(), freqs[text_idx].tolist())})
     return counts, total
 
+
+def count_features_restricted(text, feats="words", n=1, feature_set=None):
+    """
+    Get feature counts from a text, only for a given set of features, without counting all the others
+    :param text: the source text
+    :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
+    :param n: the length of n-grams
+    :param feature_set: the features to count, as a FeatureSet
+    :return: features absolute frequencies in text as a counter, and the total of frequencies, all features included
+    """
+    count_features_args_check(text, feats, n)
+
+    if feats in ("chars", "met_syll"):
+        return _count_char_ngrams_restricted(re.sub(r'\p{Z}', '_', text), n, feature_set)
+
+    if feats in ("words", "lemma", "pos", "met_line"):
+        tokens = tokenize(text, feats)
+        total = max(len(tokens) - n + 1, 0)
+        counts = Counter()
+        for i in range(total):
+            # n-grams are only made when they can be a feature
+            if tokens[i] in feature_set.first_tokens:
+                ngram = tokens[i] if n == 1 else "_".join(tokens[i:i + n])
+                if ngram in feature_set:
+                    counts[ngram] += 1
+        return counts, total
+
+    counts, total = count_features(text, feats=feats, n=n)
+    return Counter({f: c for f, c in counts.items() if f in feature_set}), total
+
+
+def _count_chunk_restricted(texts, feats, n, feature_set):
+    return [[count_features_restricted(text, feats=feats, n=order, feature_set=feature_set)
+             for order in ngram_orders(n)] for text in texts]
+
+
+class SpaceSaving:
+    """
+    Bounded-memory approximate counting of the most frequent features, with a fixed number
+    of counters (weighted SpaceSaving, Metwally et al., ICDT 2005).
+    Each kept count overestimates the true count by at most its error, and every feature
+    more frequent than total / capacity is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer.")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def _min(self):
+        # lazy deletion: skip heap entries that are not up to date
+        while True:
+            count, feat = self._heap[0]
+            if self.counts.get(feat) == count:
+                return count, feat
+            heapq.heappop(self._heap)
+
+    def update(self, counts):
+        """
+        Add a counter of features (e.g. from count_features) to the summary
+        """
+        for feat, value in counts.items():
+            if feat in self.counts:
+                self.counts[feat] += value
+            elif len(self.counts) < self.capacity:
+                self.counts[feat] = value
+                self.errors[feat] = 0
+            else:
+                min_count, min_feat = self._min()
+                heapq.heappop(self._heap)
+                del self.counts[min_feat]
+                del self.errors[min_feat]
+                self.counts[feat] = min_count + value
+                self.errors[feat] = min_count
+            heapq.heappush(self._heap, (self.counts[feat], feat))
+
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, feat) for feat, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def max_error(self):
+        return max(self.errors.values(), default=0)
+
+
+def _ngram_keys(codes, n):
+    """
+    Encode each n-gram of an array of code points as a single key, for counting with numpy.unique
+    """
+    alphabet, ids = numpy.unique(codes, return_inverse=True)
+    if len(alphabet) ** n < 2 ** 63:
+        # rolling key, in base len(alphabet)
+        keys = numpy.zeros(len(codes) - n + 1, dtype=numpy.int64)
+        for i in range(n):
+            keys = keys * len(alphabet) + ids[i:len(ids) - n + 1 + i]
+        return keys
+    # otherwise, compare raw bytes of each n-gram
+    windows = numpy.ascontiguousarray(numpy.lib.stride_tricks.sliding_window_view(codes, n))
+    return windows.view(numpy.dtype((numpy.void, 4 * n))).ravel()
+
+
+def count_char_ngrams(text, n=1):
+    """
+    Count the character n-grams of a text, with text encoded as an array of code points and
+    n-grams as integer keys. Strings are only made for distinct n-grams.
+    :param text: the source text, with spaces already substituted
+    :param n: the length of n-grams
+    :return: n-grams absolute frequencies in text as a counter (in order of first occurrence),
+    and the total of frequencies
+    """
+    return count_char_ngrams_orders(text, [n])[0]
+
+
+def count_char_ngrams_orders(text, ns):
+    """
+    Same as count_char_ngrams, for several lengths, with the keys of each length
+    computed from the keys of the previous one
+    :return: a list of (counts, total), one per length in ns
+    """
+    codes = numpy.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+    return _count_ngrams_orders(codes, ns, lambda positions, n: [text[i:i + n] for i in positions])
+
+
+def _join_ngrams(tokens, n):
+    """
+    :return: all the token n-grams of a list of tokens, as strings with tokens joined by '_'
+    """
+    return list(map("_".join, zip(*[tokens[i:] for i in range(n)])))
+
+
+def _token_ngrams(tokens, positions, n):
+    """
+    :return: the token n-grams at the given positions, as strings with tokens joined by '_'
+    """
+    if n == 1:
+        return list(map(tokens.__getitem__, positions))
+    # the i-th tokens of all the n-grams, joined column-wise
+    positions = numpy.asarray(positions)
+    columns = [map(tokens.__getitem__, (positions + i).tolist()) for i in range(n)]
+    return list(map("_".join, zip(*columns)))
+
+
+def count_token_ngrams_orders(tokens, ns):
+    """
+    Count the token n-grams of a text, with tokens joined by '_', for several lengths. In long texts with
+    few distinct tokens (see PACKED_MIN_TOKENS), n-grams of more than one token are counted from the ids
+    of the tokens (see token_ids), as packed integer keys, as count_char_ngrams_orders, with strings only
+    made for distinct n-grams. Other texts, and single tokens, are counted directly.
+    :param tokens: the tokens of the text
+    :param ns: the lengths of n-grams
+    :return: a list of (counts, total), one per length in ns, with counters in order of first occurrence
+    """
+    packed = {}
+    orders = [n for n in ns if n > 1]
+    if len(tokens) >= PACKED_MIN_TOKENS and orders:
+        distinct = dict.fromkeys(tokens)
+        if len(distinct) * PACKED_MIN_REPEATS <= len(tokens):
+            ids, size = token_ids(tokens, distinct)
+            packed = dict(zip(orders, _count_ngrams_orders(
+                ids, orders, lambda positions, n: _token_ngrams(tokens, positions, n), alphabet_size=size)))
+
+    results = []
+    for n in ns:
+        if n in packed:
+            results.append(packed[n])
+        else:
+            ngrams = tokens if n == 1 else _join_ngrams(tokens, n)
+            results.append((Counter(ngrams), len(ngrams)))
+    return results
+
+
+def _count_ngrams_orders(codes, ns, names, alphabet_size=None):
+    """
+    Count the n-grams of an array of codes (e.g. code points or token ids) for several lengths, with the keys
+    of each length computed from the keys of the previous one
+    :param names: function of the positions of n-grams and their length, returning them as strings
+    :param alphabet_size: for codes already numbered from 0 (e.g. token ids), the number of distinct codes,
+    so that they are used as they are
+    """
+    if alphabet_size is None:
+        alphabet, ids = numpy.unique(codes, return_inverse=True)
+        alphabet_size = len(alphabet)
+    else:
+        ids = codes
+    ids = ids.astype(numpy.int64)
+
+    results = {}
+    keys = numpy.zeros(len(codes), dtype=numpy.int64)
+    for n in range(1, max(ns) + 1):
+        total = len(codes) - n + 1
+        if total <= 0:
+            break
+        if alphabet_size ** n < 2 ** 63:
+            # rolling key, in base alphabet_size
+            keys = keys[:total] * alphabet_size + ids[n - 1:]
+            n_keys = keys
+        else:
+            n_keys = _ngram_keys(codes, n)
+        if n in ns:
+            _, first, freqs = numpy.unique(n_keys, return_index=True, return_counts=True)
+            order = numpy.argsort(first, kind="stable")
+            counts = Counter(dict(zip(names(first[order].tolist(), n), freqs[order].tolist())))
+            results[n] = (counts, total)
+
+    return [results.get(n, (Counter(), 0)) for n in ns]
+
+
+def _char_classes(codes, pattern):
+    """
+    Boolean mask of the code points matching a one-character regex, tested once per distinct character
+    """
+    alphabet, ids = numpy.unique(codes, return_inverse=True)
+    matches = numpy.array([re.fullmatch(pattern, chr(c)) is not None for c in alphabet.tolist()], dtype=bool)
+    return matches[ids]
+
+
+def count_affixes(text, n=3):
+    """
+    Count affixes and punctuation n-grams, following Sapkota et al., NAACL 2015: word prefixes and suffixes,
+    and space affixes and punctuation n-grams, found from whitespace and punctuation masks over the text
+    :param text: the source text
+    :param n: the length of n-grams
+    :return: affixes absolute frequencies in text as a counter, and the total of frequencies,
+    all char n-grams included
+    """
+    # relative frequencies should be computed from all existing n-grams
+    total = max(len(text) - n + 1, 0)
+
+    # word prefixes and suffixes
+    prefixes = []
+    suffixes = []
+    for w in wordpunct_tokenize(text):
+        if len(w) > n:
+            prefixes.append(w[:3])
+            suffixes.append(w[-3:])
+    counts = Counter(prefixes)
+    counts.update(suffixes)
+
+    if total == 0:
+        return counts, total
+
+    # space affixes (and punct affixes if keep_punct has been enabled)
+    codes = numpy.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+    is_space = _char_classes(codes, r'\p{Z}')
+    is_punct = numpy.concatenate(([0], numpy.cumsum(_char_classes(codes, r'\p{P}'))))
+    selected = is_space[:total] | is_space[n - 1:] | (is_punct[n:] - is_punct[:total] > 0)
+    if n > 1:
+        # as with regex, a space before a final newline is at the end
+        selected |= is_space[n - 2:len(codes) - 1] & (codes[n - 1:] == ord("\n"))
+    positions = numpy.flatnonzero(selected)
+
+    if len(positions):
+        substituted = numpy.where(is_space, numpy.uint32(ord("_")), codes)
+        _, first, freqs = numpy.unique(_ngram_keys(substituted, n)[positions], return_index=True,
+                                       return_counts=True)
+        substituted = re.sub(r'\p{Z}', '_', text)
+        order = numpy.argsort(first, kind="stable")
+        counts.update({substituted[i:i + n]: freq
+                       for i, freq in zip(positions[first[order]].tolist(), freqs[order].tolist())})
+
+    return counts, total
+
+
 def relative_frequencies(wordCounts, total):
     """
     For a counter of word counts, return the relative frequencies
@@ -90,33 +693,135 @@ def bin_frequencies(wordCounts):
     return wordCounts
 
 
-def get_feature_list(myTexts, feats="words", n=1, freqsType="relative"):
+def get_feature_list(myTexts, feats="words", n=1, freqsType="relative", cache=None, workers=1,
+                     approx_capacity=None, exact_pass=True):
     """
     :param myTexts: a 'myTexts' object, containing documents to be processed
     :param feat_list: a list of features to be selected
     :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
     :param freqsType: "relative", "absolute" or "binary" frequencies
-    :param n: n-grams length
+    :param n: n-grams length, or a [min, max] range of lengths, counted in a single pass (with relative
+    frequencies computed for each length)
+    :param cache: an optional CountCache, to be reused by get_counts
+    :param workers: number of worker processes for counting (1 for serial, -1 for all CPUs)
+    :param approx_capacity: if set, number of counters kept for an approximate vocabulary (SpaceSaving),
+    instead of exact counts of all features (the cache is then not used)
+    :param exact_pass: with approx_capacity, recount exactly the kept candidates in a second pass
     :return: list of features, with total frequency
     """
+    texts = DocumentTexts(myTexts)
+
+    if isinstance(n, (list, tuple)):
+        if approx_capacity is None:
+            if cache is None:
+                cache = CountCache()
+            cache.count_documents(myTexts, feats=feats, n=n, workers=workers)
+        my_feats = merge_feature_lists([
+            get_feature_list(myTexts, feats=feats, n=order, freqsType=freqsType, cache=cache, workers=workers,
+                             approx_capacity=approx_capacity, exact_pass=exact_pass)
+            for order in ngram_orders(n)
+        ], freqsType)
+        return sorted(my_feats, key=lambda f: f[1], reverse=True)
+
     my_feats = Counter()
     total = 0
 
-    for text in myTexts:
-        counts, text_total = count_features(text["text"], feats=feats, n=n)
+    if approx_capacity is not None:
+        summary = SpaceSaving(approx_capacity)
+        for counts, text_total in count_features_many(texts, feats=feats, n=n, workers=workers):
+            summary.update(counts)
+            total = total + text_total
+
+        if exact_pass:
+            candidates = set(summary.counts)
+            for counts, _ in count_features_many(texts, feats=feats, n=n, workers=workers):
+                my_feats.update({f: c for f, c in counts.items() if f in candidates})
+        else:
+            print(f"Approximate feature counts: overestimated by at most {summary.max_error()}"
+                  f" (total: {total}, {approx_capacity} counters)")
+            my_feats.update(summary.counts)
+        results = []
+
+    elif cache is None and workers != 1 and len(texts) > 1:
+        # per-chunk counters are merged in the workers, and then in chunks order
+        results = _map_chunks(_count_chunk_merged, texts, feats, n, workers)
+    else:
+        results = _count_documents(myTexts, feats=feats, n=n, cache=cache, workers=workers)
 
+    for counts, text_total in results:
         my_feats.update(counts)
         total = total + text_total
 
+    return _sorted_frequencies(my_feats, total, freqsType)
+
+
+def _sorted_frequencies(my_feats, total, freqsType):
     if freqsType == "relative":
         my_feats = relative_frequencies(my_feats, total)
     elif freqsType == "binary":
         my_feats = bin_frequencies(my_feats)
 
     # sort them
-    my_feats = [(i, my_feats[i]) for i in sorted(my_feats, key=my_feats.get, reverse=True)]
+    return [(i, my_feats[i]) for i in sorted(my_feats, key=my_feats.get, reverse=True)]
+
 
-    return my_feats
+def merge_feature_lists(feat_lists, freqsType="relative"):
+    """
+    Merge feature lists (e.g. one for each n-grams length), adding up the frequencies of a feature found in
+    several of them, as get_counts does for its counts
+    :param feat_lists: lists of (feature, frequency)
+    :param freqsType: "relative", "absolute" or "binary" frequencies
+    :return: list of features, each once, in order of first occurrence
+    """
+    my_feats = Counter()
+    for feat_list in feat_lists:
+        for feature, frequency in feat_list:
+            my_feats[feature] += frequency
+    if freqsType == "binary":
+        my_feats = bin_frequencies(my_feats)
+    return list(my_feats.items())
+
+
+class VocabularyCounter:
+    """
+    Total counts of features, updated one text at a time, as in get_feature_list, but without holding the texts
+    (e.g. for documents streamed by load_corpus_iter)
+    """
+
+    def __init__(self, feats="words", n=1, freqsType="relative", approx_capacity=None):
+        """
+        :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
+        :param n: n-grams length, or a [min, max] range of lengths
+        :param freqsType: "relative", "absolute" or "binary" frequencies
+        :param approx_capacity: if set, number of counters kept for an approximate vocabulary (SpaceSaving)
+        """
+        self.feats = feats
+        self.orders = ngram_orders(n)
+        self.freqsType = freqsType
+        self.approx_capacity = approx_capacity
+        if approx_capacity is None:
+            self.counts = [Counter() for _ in self.orders]
+        else:
+            self.counts = [SpaceSaving(approx_capacity) for _ in self.orders]
+        self.totals = [0] * len(self.orders)
+
+    def update(self, text):
+        for i, (counts, total) in enumerate(count_features_orders(text, feats=self.feats, ns=self.orders)):
+            self.counts[i].update(counts)
+            self.totals[i] = self.totals[i] + total
+
+    def feature_lists(self):
+        """
+        :return: for each n-grams length, the list of features, with total frequency
+        """
+        results = []
+        for counts, total in zip(self.counts, self.totals):
+            if self.approx_capacity is not None:
+                print(f"Approximate feature counts: overestimated by at most {counts.max_error()}"
+                      f" (total: {total}, {self.approx_capacity} counters)")
+                counts = Counter(counts.counts)
+            results.append(_sorted_frequencies(counts, total, self.freqsType))
+        return results
 
 def get_doc_frequency(myTexts):
     """
@@ -128,36 +833,109 @@ def get_doc_frequency(myTexts):
     return feats_doc_freq
 
 
-def get_counts(myTexts, feat_list=None, feats = "words", n = 1, freqsType = "relative"):
+def get_counts(myTexts, feat_list=None, feats = "words", n = 1, freqsType = "relative", cache=None, workers=1):
     """
     Get counts for a collection of texts
     :param myTexts: the document collection
     :param feat_list: a list of features to be selected (None for all)
     :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
-    :param n: the length of n-grams
+    :param n: the length of n-grams, or a [min, max] range of lengths
     :param freqsType: relative, absolute or binarised freqs
+    :param cache: an optional CountCache, e.g. already filled by get_feature_list. Without it, and with
+    a feat_list (that can be given as a FeatureSet, to be reused between calls), only the features in the list
+    are counted
+    :param workers: number of worker processes for counting (1 for serial, -1 for all CPUs)
     :return: the collection with, for each text, a 'wordCounts' dictionary
     """
 
     if freqsType not in ["relative", "absolute", "binary"]:
         raise ValueError("Unsupported frequency type. Choose from 'relative', 'absolute', or 'binary'.")
 
-    for i in enumerate(myTexts):
-
-        counts, total = count_features(myTexts[i[0]]["text"], feats=feats, n=n)
-
-        if freqsType == "relative":
-            counts = relative_frequencies(counts, total)
+    texts = DocumentTexts(myTexts)
+
+    if feat_list and cache is None:
+        # restricted counting, with counters already limited to the feature list
+        feature_set = feat_list if isinstance(feat_list, FeatureSet) else FeatureSet(feat_list)
+        if workers == 1 or len(texts) < 2:
+            results = _count_chunk_restricted(texts, feats, n, feature_set)
+        else:
+            results = (result for chunk in _map_chunks(_count_chunk_restricted, texts, feats, n, workers,
+                                                       feature_set)
+                       for result in chunk)
+        if not isinstance(n, (list, tuple)):
+            results = (result[0] for result in results)
+        feat_list = None
+    else:
+        results = _count_documents(myTexts, feats=feats, n=n, cache=cache, workers=workers)
 
-        elif freqsType == "binary":
-            counts = bin_frequencies(counts)
+    for i, result in zip(enumerate(myTexts), results):
 
-        if feat_list:
-            # and keep only the ones in the feature list
-            counts = {f: counts[f] for f in feat_list if f in counts.keys()}
+        if isinstance(n, (list, tuple)):
+            # frequencies are computed for each length, and then merged, adding up the ones of a feature
+            # found with several lengths (e.g. a token containing '_' and a token n-gram)
+            counts = Counter()
+            for order_counts, order_total in result:
+                counts.update(_frequencies(order_counts, order_total, feat_list, freqsType))
+            if freqsType == "binary":
+                counts = bin_frequencies(counts)
+        else:
+            counts = _frequencies(result[0], result[1], feat_list, freqsType)
 
         myTexts[i[0]]["wordCounts"] = counts
 
     return myTexts
 
 
+def _frequencies(counts, total, feat_list, freqsType):
+    if feat_list:
+        # keep only the ones in the feature list
+        counts = {f: counts[f] for f in feat_list if f in counts.keys()}
+    else:
+        # copy, as cached counts are shared
+        counts = Counter(counts)
+
+    if freqsType == "relative":
+        counts = relative_frequencies(counts, total)
+
+    elif freqsType == "binary":
+        counts = bin_frequencies(counts)
+
+    return counts
+
+
+
+
+def get_hashed_counts(myTexts, n_buckets, feats="words", n=1, freqsType="relative", workers=1):
+    """
+    Get counts for a collection of texts, hashed into a fixed number of buckets (hashing trick),
+    without any feature list, so that each text is vectorized independently, one at a time
+    :param myTexts: the document collection
+    :param n_buckets: the number of buckets (columns)
+    :param feats: the type of features, one of 'words', 'chars', 'affixes, 'lemma', 'pos', 'met_line' and 'met_syll'.
+    :param n: the length of n-grams, or a [min, max] range of lengths
+    :param freqsType: relative, absolute or binarised freqs
+    :param workers: number of worker processes for counting (1 for serial, -1 for all CPUs)
+    :return: a scipy.sparse CSR matrix, with one row per text and one column per bucket
+    """
+
+    if freqsType not in ["relative", "absolute", "binary"]:
+        raise ValueError("Unsupported frequency type. Choose from 'relative', 'absolute', or 'binary'.")
+
+    def freqs():
+        for result in count_features_many(DocumentTexts(myTexts), feats=feats, n=ngram_orders(n),
+                                          workers=workers):
+            merged = Counter()
+            for counts, total in result:
+                if freqsType == "relative":
+                    counts = relative_frequencies(counts, total)
+                merged.update(counts)
+            yield merged
+
+    hasher = FeatureHasher(n_features=n_buckets, input_type="dict", alternate_sign=False)
+    matrix = hasher.transform(freqs())
+
+    if freqsType == "binary":
+        # colliding features are still a single bucket
+        matrix.data[:] = 1
+
+    return matrix
@@ -1,12 +1,20 @@
 from lxml import etree
-import nltk.tokenize
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import numpy
+import os
 import random
-from typing import List, Dict, Optional, Tuple
+import zlib
+from typing import List, Dict, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
 
 from superstyl.config import Config, NormalizationConfig, SamplingConfig
 from superstyl.preproc.utils import *
+from superstyl.preproc.cache import TextCache
+from superstyl.preproc.archives import ArchiveMember, expand_archives, open_source
 
 
 # ============================================================================
@@ -148,71 +156,209 @@ class TXTLoader(FileLoader):
     """Loader for plain text files."""
     
     def load(self, path: str, **kwargs) -> Tuple[str, str]:
-        with open(path, 'r') as f:
+        with open_source(path) as f:
             text = ' '.join(f.readlines())
         
         author = extract_author_from_path(path)
         return author, normalize_whitespace(text)
 
 
+TEI_NS = "{http://www.tei-c.org/ns/1.0}"
+TXM_NS = "{http://textometrie.org/1.0}"
+
+# Line breaks of str.splitlines
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+def _string_value(element) -> str:
+    """XPath string value of an element (text of all descendants)."""
+    return "".join(element.itertext())
+
+
+def _iter_lines(pieces: Iterator[str], batch_size: int = 1024) -> Iterator[str]:
+    """
+    Split a stream of output strings into lines, as str.splitlines on their concatenation
+    (pieces are joined and split by batches).
+    """
+    pending = ""
+    for batch in iter(lambda: list(itertools.islice(pieces, batch_size)), []):
+        lines = (pending + "".join(batch)).splitlines(keepends=True)
+        if not lines:
+            continue
+        # the last line is kept for later, unless complete (a final '\r' may still be followed by '\n')
+        if lines[-1][-1] in LINE_BREAKS and lines[-1][-1] != "\r":
+            pending = ""
+        else:
+            pending = lines.pop()
+        for line in lines:
+            yield line.splitlines()[0]
+    yield from pending.splitlines()
+
+
+def _iter_outermost(path: str, tag: str) -> Iterator:
+    """
+    Stream an XML file with iterparse, yielding the outermost elements with a given tag (or any of a tuple
+    of tags), in document order.
+    They are then cleared, with the already parsed elements before them, so that the tree is never built
+    in full.
+    """
+    tags = tag if isinstance(tag, tuple) else (tag,)
+    with open_source(path, binary=True) as source:
+        for _, element in etree.iterparse(source, tag=tags):
+            if next(element.iterancestors(*tags), None) is not None:
+                continue
+            yield element
+            element.clear(keep_tail=True)
+            if element.getprevious() is None:
+                # first unit of its parent: elements parsed before are cleared as well
+                for node in element.iterancestors():
+                    while node.getprevious() is not None:
+                        del node.getparent()[0]
+            else:
+                del element.getparent()[:element.getparent().index(element)]
+
+
 class XMLLoader(FileLoader):
-    """Loader for XML files."""
-    
-    def __init__(self):
-        self.xslt = etree.XSLT(etree.XML(XSLT_TEMPLATES['xml_text']))
-    
+    """
+    Loader for XML files.
+    Text is streamed as with XSLT_TEMPLATES['xml_text'], from song/text elements.
+    """
+
     def load(self, path: str, **kwargs) -> Tuple[str, str]:
-        with open(path, 'r') as f:
-            doc = etree.parse(f)
-        
-        authors = doc.findall("//author")
-        author_texts = [a.text for a in authors]
-        
+        author_texts = []
+        texts = []
+        with open_source(path, binary=True) as source:
+            for _, element in etree.iterparse(source, tag=("author", "text")):
+                parent = element.getparent()
+                if parent is None:
+                    continue
+                if element.tag == "author":
+                    author_texts.append(element.text)
+                elif parent.tag == "song" and parent.getparent() is None:
+                    texts.append(_string_value(element))
+                    element.clear(keep_tail=True)
+
         if len(author_texts) != 1:
             print(f"Warning: Expected 1 author in {path}, found {len(author_texts)}")
             author = author_texts[0] if author_texts else "unknown"
         else:
             author = author_texts[0]
-        
-        text = str(self.xslt(doc))
+
+        text = "".join(texts)
         return author, normalize_whitespace(text)
 
 
 class XMLUnitLoader(ABC):
-    """Base class for XML loaders that extract units."""
-    
-    def __init__(self, template_name: str):
-        self.xslt = etree.XSLT(etree.XML(XSLT_TEMPLATES[template_name]))
-    
-    def extract_units(self, path: str, units: str = "verses", 
-                     feats: str = "words") -> List[str]:
+    """
+    Base class for XML loaders that extract units.
+
+    Files are streamed with iterparse, and units (tei:l or tei:w) are rendered as they
+    are parsed, with the same output as the XSLT_TEMPLATES stylesheets.
+    """
+
+    UNIT_TAGS = {"verses": TEI_NS + "l", "words": TEI_NS + "w"}
+    LAYERS = ("lemma", "pos")  # annotations rendered instead of words
+
+    def layer(self, feats: str) -> str:
+        """Annotation layer rendered for a feature type ('words' for the text itself)."""
+        feats = self._feats_param(feats)
+        return feats if feats in self.LAYERS else "words"
+
+    def iter_units(self, path: str, units: str = "verses",
+                   feats: str = "words") -> Iterator[str]:
+        """Extract units from XML file, one by one."""
+        if units not in self.UNIT_TAGS:
+            return iter([])
+        tag = self.UNIT_TAGS[units]
+        feats = self._feats_param(feats)
+        pieces = (piece for element in _iter_outermost(path, tag)
+                  for piece in self._render_units(element, tag, units, feats))
+        return _iter_lines(pieces)
+
+    def extract_units(self, path: str, units: str = "verses",
+                      feats: str = "words") -> List[str]:
         """Extract units from XML file."""
-        with open(path, 'r') as f:
-            doc = etree.parse(f)
-        
-        params = self._get_xslt_params(units, feats)
-        result = str(self.xslt(doc, **params))
-        return result.splitlines()
-    
+        return list(self.iter_units(path, units, feats))
+
+    def extract_layers(self, path: str, layers: List[Tuple[str, str]]) -> List[List[str]]:
+        """
+        Extract units for several layers from a single parse of an XML file.
+
+        Args:
+            path: Path to the XML file
+            layers: (units, feats) pairs
+
+        Returns:
+            For each layer, the same list of units as extract_units
+        """
+        tags = {units: self.UNIT_TAGS[units] for units, _ in layers if units in self.UNIT_TAGS}
+        pieces = {layer: [] for layer in layers}
+        if tags:
+            for element in _iter_outermost(path, tuple(set(tags.values()))):
+                for units, feats in pieces:
+                    if units in tags:
+                        pieces[(units, feats)].extend(
+                            self._render_units(element, tags[units], units, self._feats_param(feats)))
+        results = {layer: list(_iter_lines(iter(layer_pieces))) for layer, layer_pieces in pieces.items()}
+        return [results[layer] for layer in layers]
+
+    def _render_units(self, element, tag: str, units: str, feats: str) -> Iterator[str]:
+        """Render the units with a given tag, from an element and its descendants."""
+        if units == "verses":
+            return (self._render_verse(verse, feats) for verse in element.iter(tag))
+        return (self._render_word(word, feats, units) for word in element.iter(tag))
+
+    def _render_children(self, element, feats: str, units: str) -> str:
+        """Text of an element, with tei:w descendants rendered as words (XSLT built-in templates)."""
+        if len(element) == 0:
+            return element.text or ""
+        pieces = [element.text or ""]
+        for child in element:
+            if child.tag == TEI_NS + "w":
+                pieces.append(self._render_word(child, feats, units))
+            elif isinstance(child.tag, str):
+                pieces.append(self._render_children(child, feats, units))
+            pieces.append(child.tail or "")
+        return "".join(pieces)
+
+    def _feats_param(self, feats: str) -> str:
+        return feats
+
+    @abstractmethod
+    def _render_verse(self, verse, feats: str) -> str:
+        """Render a tei:l element."""
+        pass
+
     @abstractmethod
-    def _get_xslt_params(self, units: str, feats: str) -> Dict:
-        """Get XSLT parameters for transformation."""
+    def _render_word(self, word, feats: str, units: str) -> str:
+        """Render a tei:w element."""
         pass
 
 
 class TEIUnitLoader(XMLUnitLoader):
-    """Loader for TEI files with unit extraction."""
-    
-    def __init__(self):
-        super().__init__('tei_units')
-    
-    def _get_xslt_params(self, units: str, feats: str) -> Dict:
-        feats_param = "met" if feats in ["met_syll", "met_line"] else feats
-        return {
-            'units': etree.XSLT.strparam(units),
-            'feats': etree.XSLT.strparam(feats_param)
-        }
-    
+    """Loader for TEI files with unit extraction (as XSLT_TEMPLATES['tei_units'])."""
+
+    LAYERS = ("lemma", "pos", "met")
+
+    def _feats_param(self, feats: str) -> str:
+        return "met" if feats in ["met_syll", "met_line"] else feats
+
+    def _render_verse(self, verse, feats: str) -> str:
+        if feats == "met":
+            text = verse.get("met", "").replace(".", "")
+        else:
+            text = "".join(self._render_word(word, feats, "verses") for word in verse.iter(TEI_NS + "w"))
+        return text + "\n"
+
+    def _render_word(self, word, feats: str, units: str) -> str:
+        if feats == "met":
+            text = word.get("met", "")
+        elif feats in ("lemma", "pos"):
+            text = word.get(feats, "")
+        else:
+            text = self._render_children(word, feats, units)
+        return " " + text + ("\n" if units == "words" else "")
+
     def load(self, path: str, feats: str = "words", **kwargs) -> Tuple[str, str]:
         """Load TEI file and return (author, text) tuple."""
         author = extract_author_from_path(path)
@@ -222,17 +368,28 @@ class TEIUnitLoader(XMLUnitLoader):
 
 
 class TXMUnitLoader(XMLUnitLoader):
-    """Loader for TXM files with unit extraction."""
-    
-    def __init__(self):
-        super().__init__('txm_units')
-    
-    def _get_xslt_params(self, units: str, feats: str) -> Dict:
-        return {
-            'units': etree.XSLT.strparam(units),
-            'feats': etree.XSLT.strparam(feats)
-        }
-    
+    """Loader for TXM files with unit extraction (as XSLT_TEMPLATES['txm_units'])."""
+
+    @staticmethod
+    def _is_proper_noun(word) -> bool:
+        return any(ana.get("type") == "#frpos" and _string_value(ana) == "NOMpro"
+                   for ana in word.iterchildren(TXM_NS + "ana"))
+
+    def _render_verse(self, verse, feats: str) -> str:
+        return "".join(self._render_word(word, feats, "verses") for word in verse.iter(TEI_NS + "w")
+                       if not self._is_proper_noun(word)) + "\n"
+
+    def _render_word(self, word, feats: str, units: str) -> str:
+        if feats == "lemma":
+            lemma = next(word.iterchildren(TXM_NS + "lemma"), None)
+            text = _string_value(lemma) if lemma is not None else ""
+        elif feats == "pos":
+            ana = next((ana for ana in word.iterchildren(TXM_NS + "ana") if ana.get("type") == "#frpos"), None)
+            text = _string_value(ana) if ana is not None else ""
+        else:
+            text = "".join(self._render_children(form, feats, units) for form in word.iterchildren(TXM_NS + "form"))
+        return " " + text + ("\n" if units == "words" else "")
+
     def load(self, path: str, feats: str = "words", **kwargs) -> Tuple[str, str]:
         """Load TXM file and return (author, text) tuple."""
         author = extract_author_from_path(path)
@@ -241,15 +398,101 @@ class TXMUnitLoader(XMLUnitLoader):
         return author, text
 
 
+class RecordLoader(ABC):
+    """
+    Base class for loaders of corpus containers, with one record per document
+    (with an id, an author, a text, and an optional lang).
+    """
+
+    FIELDS = ("id", "author", "text")
+
+    @abstractmethod
+    def iter_records(self, path: str) -> Iterator[Dict]:
+        """Yield records as dictionaries, with id, author, text and lang (None if missing)."""
+        pass
+
+    def _check(self, record: Dict, where: str) -> Dict:
+        missing = [field for field in self.FIELDS if record.get(field) is None]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)} in {where}")
+        return {"id": str(record["id"]), "author": str(record["author"]), "text": record["text"],
+                "lang": record.get("lang")}
+
+
+class JSONLLoader(RecordLoader):
+    """Loader for JSON Lines files, with one record per line."""
+
+    def iter_records(self, path: str) -> Iterator[Dict]:
+        with open_source(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield self._check(json.loads(line), f"{path}, line {line_number}")
+
+
+class ParquetLoader(RecordLoader):
+    """Loader for Parquet files, read by batches of rows, with only the needed columns."""
+
+    def __init__(self, batch_size: int = 65536):
+        self.batch_size = batch_size
+
+    def iter_records(self, path: str) -> Iterator[Dict]:
+        import pyarrow.parquet
+
+        with open_source(path, binary=True) as source, pyarrow.parquet.ParquetFile(source) as parquet_file:
+            names = parquet_file.schema_arrow.names
+            missing = [field for field in self.FIELDS if field not in names]
+            if missing:
+                raise ValueError(f"Missing {', '.join(missing)} columns in {path}")
+            columns = list(self.FIELDS) + (["lang"] if "lang" in names else [])
+
+            for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=columns):
+                data = batch.to_pydict()
+                for i in range(batch.num_rows):
+                    yield self._check({column: data[column][i] for column in columns}, path)
+
+
 # Loader factory
 LOADERS = {
     'txt': TXTLoader(),
     'xml': XMLLoader(),
     'tei': TEIUnitLoader(),
-    'txm': TXMUnitLoader()
+    'txm': TXMUnitLoader(),
+    'jsonl': JSONLLoader(),
+    'parquet': ParquetLoader()
 }
 
 
+def feature_layers(config: Config) -> List[str]:
+    """
+    Annotation layers (e.g. words, lemma, pos) needed by the features of a config, the layer of
+    the first feature first, or an empty list for formats without annotation layers.
+    """
+    loader = LOADERS[config.corpus.format]
+    if not isinstance(loader, XMLUnitLoader):
+        return []
+    layers = []
+    for feature in config.features:
+        layer = loader.layer(feature.type)
+        if layer not in layers:
+            layers.append(layer)
+    return layers
+
+
+def layer_texts(documents: List[Dict], config: Config, feats: str) -> List[Dict]:
+    """
+    Documents with, as text, the annotation layer of a feature type,
+    for documents loaded with several layers (see feature_layers).
+    """
+    if not any("layers" in document for document in documents):
+        return documents
+    layer = LOADERS[config.corpus.format].layer(feats)
+    documents = [dict(document, text=document["layers"][layer]) for document in documents]
+    for document in documents:
+        if "layer_units" in document:
+            document["units"] = document["layer_units"][layer]
+    return documents
+
+
 def XML_to_text(path: str) -> Tuple[str, str]:
     """Legacy function for XML loading."""
     return LOADERS['xml'].load(path)
@@ -279,6 +522,95 @@ def specialXML_to_text(path: str, format: str = "tei", feats: str = "words") ->
 # Sampling Functions
 # ============================================================================
 
+class TokenWindow(Sequence):
+    """
+    Tokens [start:end] of a token list, shared by all the samples of a document, so that
+    (possibly overlapping) samples do not copy their tokens.
+    """
+
+    __slots__ = ("tokens", "start", "end")
+
+    def __init__(self, tokens, start: int, end: int):
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.tokens[i] for i in range(self.start, self.end)[index]]
+        return self.tokens[range(self.start, self.end)[index]]
+
+    def __iter__(self):
+        return map(self.tokens.__getitem__, range(self.start, self.end))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (TokenWindow, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TokenWindow({list(self)!r})"
+
+    def over(self, tokens) -> 'TokenWindow':
+        """Same window over other tokens (e.g. an aligned annotation layer)."""
+        return TokenWindow(tokens, self.start, self.end)
+
+    def key(self) -> Tuple[int, int, int]:
+        """Key of the window, from its token list (while it is alive), start and size, e.g. for cached counts."""
+        return id(self.tokens), self.start, len(self)
+
+
+class TokenSample(Sequence):
+    """
+    Tokens drawn, with replacement, from a token list shared by all the random samples of a document,
+    as an array of indices, so that samples do not copy their tokens.
+    """
+
+    __slots__ = ("tokens", "indices")
+
+    def __init__(self, tokens, indices: numpy.ndarray):
+        self.tokens = tokens
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.tokens[i] for i in self.indices[index].tolist()]
+        return self.tokens[int(self.indices[index])]
+
+    def __iter__(self):
+        return map(self.tokens.__getitem__, self.indices.tolist())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (TokenSample, TokenWindow, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TokenSample({list(self)!r})"
+
+    def over(self, tokens) -> 'TokenSample':
+        """Same sample over other tokens (e.g. an aligned annotation layer)."""
+        return TokenSample(tokens, self.indices)
+
+    def key(self) -> Tuple[int, int]:
+        """Key of the sample, from its token list and indices (while they are alive), e.g. for cached counts."""
+        return id(self.tokens), id(self.indices)
+
+    def multiplicities(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :return: the indices of the drawn tokens, in order of first draw, and the number of times each one was drawn
+        """
+        indices, first, counts = numpy.unique(self.indices, return_index=True, return_counts=True)
+        order = numpy.argsort(first, kind="stable")
+        return indices[order], counts[order]
+
+
 class Sampler:
     """
     Handles text sampling operations.
@@ -289,37 +621,79 @@ class Sampler:
         """
         Extract tokens from a document based on format and units.
         """
+        return Sampler._extract(path, config)[0]
+
+    @staticmethod
+    def extract_tokens_and_text(path: str, config: Config=Config()) -> Tuple[List[str], str]:
+        """
+        Extract tokens from a document, as extract_tokens, and its text as loaded by LOADERS
+        (e.g. for language identification), from a single parse of the file.
+        """
+        return Sampler._extract(path, config, with_text=True)
+
+    @staticmethod
+    def tokenize(text: str, config: Config=Config()) -> List[str]:
+        """
+        Normalise a text, and split it into word tokens.
+        """
+        return wordpunct_tokenize(normalise(text, config.normalization))
+
+    @staticmethod
+    def _extract(path: str, config: Config, with_text: bool = False) -> Tuple[List[str], Optional[str]]:
         feats=config.features[0].type
 
         if config.sampling.units == "words" and config.corpus.format == "txt":
             author, text = LOADERS['txt'].load(path)
-            text = normalise(text, config.normalization)
-            return nltk.tokenize.wordpunct_tokenize(text)
-        
-        elif config.corpus.format == "tei":
-            return LOADERS['tei'].extract_units(path, config.sampling.units, feats)
-        
-        elif config.sampling.units == "verses" and config.corpus.format == "txm":
-            return LOADERS['txm'].extract_units(path, config.sampling.units, feats)
-        
+            return Sampler.tokenize(text, config), text
+
+        elif config.corpus.format == "tei" or (config.sampling.units == "verses" and config.corpus.format == "txm"):
+            loader = LOADERS[config.corpus.format]
+            if not with_text:
+                return loader.extract_units(path, config.sampling.units, feats), None
+            # the text is made of words units, as in loader.load
+            tokens, words = loader.extract_layers(path, [(config.sampling.units, feats), ("words", feats)])
+            return tokens, normalize_whitespace(' '.join(words))
+
         else:
             raise ValueError(f"Unsupported combination: units={config.sampling.units}, format={config.corpus.format}")
     
     @staticmethod
-    def create_samples(tokens: List[str], sampling_config: SamplingConfig=SamplingConfig()) -> List[Dict]:
+    def document_rng(sampling_config: SamplingConfig, name: str) -> Optional[numpy.random.Generator]:
         """
-        Create samples from tokens.
+        Random generator for the samples of a document, derived from the sampling seed and the document name,
+        so that samples do not depend on the order in which documents are loaded (e.g. in parallel).
+        Without seed, the seed is drawn from the random module, so that samples can still be made reproducible
+        with random.seed (when documents are loaded serially). None if samples are not random.
+        """
+        if not sampling_config.random:
+            return None
+        seed = random.getrandbits(64) if sampling_config.seed is None else sampling_config.seed
+        return numpy.random.default_rng([seed, zlib.crc32(name.encode("utf-8"))])
+
+    @staticmethod
+    def create_samples(tokens: List[str], sampling_config: SamplingConfig=SamplingConfig(),
+                       rng: Optional[numpy.random.Generator] = None) -> List[Dict]:
+        """
+        Create samples from tokens. Samples are windows (TokenWindow) over the tokens, or, for random
+        sampling, tokens drawn with rng (TokenSample, by default from the sampling seed), without copy.
         """
         step = sampling_config.step if sampling_config.step is not None else sampling_config.size
         
         samples = []
         
         if sampling_config.random:
+            if not len(tokens):
+                return samples
+            if rng is None:
+                rng = numpy.random.default_rng(random.getrandbits(64) if sampling_config.seed is None
+                                               else sampling_config.seed)
+            # all the samples are drawn at once
+            indices = rng.integers(len(tokens), size=(sampling_config.max_samples, sampling_config.size))
             for k in range(sampling_config.max_samples):
                 samples.append({
                     "start": f"{k}s",
                     "end": f"{k}e",
-                    "text": list(random.choices(tokens, k=sampling_config.size))
+                    "text": TokenSample(tokens, indices[k])
                 })
         else:
             current = 0
@@ -327,20 +701,21 @@ class Sampler:
                 samples.append({
                     "start": current,
                     "end": current + sampling_config.size,
-                    "text": list(tokens[current:current + sampling_config.size])
+                    "text": TokenWindow(tokens, current, current + sampling_config.size)
                 })
                 current += step
         
         return samples
     
     @classmethod
-    def get_samples(cls, path: str, config: Config=Config()) -> List[Dict]:
+    def get_samples(cls, path: str, config: Config=Config(), tokens: Optional[List[str]] = None) -> List[Dict]:
         """
         Extract samples from a document.
         
         Args:
             path: Path to document
             config: Config file
+            tokens: Tokens of the document, if already extracted
 
         Returns:
             List of sample dictionaries
@@ -348,35 +723,36 @@ class Sampler:
         max_samples = config.sampling.max_samples or 10
         config.sampling.validate()
         
-        tokens = cls.extract_tokens(path, config)
-        return cls.create_samples(tokens, config.sampling)
+        if tokens is None:
+            tokens = cls.extract_tokens(path, config)
+        return cls.create_samples(tokens, config.sampling, rng=cls.document_rng(config.sampling, path.split('/')[-1]))
 
 
-def max_sampling(documents: List[Dict], max_samples: int = 10) -> List[Dict]:
+def max_sampling(documents: List[Dict], max_samples: int = 10, seed: Optional[int] = None) -> List[Dict]:
     """
     Randomly select up to max_samples per author/class.
     
     Args:
         documents: List of text dict
         max_samples: Maximum samples per author
+        seed: Seed of the selection (by default, the global random state is used)
     
     Returns:
-        Filtered list of documents
+        Filtered list of documents, grouped by author, in order of first appearance
     """
-    # Count documents per author
-    author_counts = {}
+    # Index documents per author
+    author_docs = {}
     for doc in documents:
-        author_counts[doc['aut']] = author_counts.get(doc['aut'], 0) + 1
-    
+        author_docs.setdefault(doc['aut'], []).append(doc)
+
     # Filter authors with too many samples
+    rng = random if seed is None else random.Random(seed)
     result = []
-    for author, count in author_counts.items():
-        author_docs = [d for d in documents if d['aut'] == author]
-
-        if count > max_samples:
-            result.extend(random.sample(author_docs, k=max_samples))
+    for docs in author_docs.values():
+        if len(docs) > max_samples:
+            result.extend(rng.sample(docs, k=max_samples))
         else:
-            result.extend(author_docs)
+            result.extend(docs)
     
     return result
 
@@ -385,90 +761,445 @@ def max_sampling(documents: List[Dict], max_samples: int = 10) -> List[Dict]:
 # Main Loading Functions
 # ============================================================================
 
+def _cache_options(func, config: Config, normalised: bool = True) -> Optional[Dict]:
+    """
+    Loading options on which the output of func depends, for the TextCache,
+    or None if it is not to be cached.
+    """
+    if config.corpus.cache_dir is None:
+        return None
+    samples = func in (_load_document_samples, _load_records_samples)
+    if samples and config.sampling.random and config.sampling.seed is None:
+        return None
+
+    options = {
+        "loader": func.__name__,
+        "format": config.corpus.format,
+        "layers": feature_layers(config),
+        "normalization": config.normalization.to_dict(),
+        "identify_lang": config.corpus.identify_lang,
+        "normalised": normalised
+    }
+    if samples:
+        options["sampling"] = {"units": config.sampling.units, "size": config.sampling.size,
+                               "step": config.sampling.step}
+        if config.sampling.random:
+            options["sampling"].update(random=True, max_samples=config.sampling.max_samples,
+                                       seed=config.sampling.seed)
+    return options
+
+
+def _map_paths(func, paths: List[str], config: Config, normalised: bool = True) -> List:
+    """
+    Apply func(path, config, normalised) to each path, over a process pool with config.corpus.workers.
+    Each worker process has its own LOADERS, and results are returned in paths order.
+    With config.corpus.cache_dir, results are read from (and written to) a TextCache.
+    """
+    return list(_iter_paths(func, paths, config, window=None, normalised=normalised))
+
+
+def _iter_paths(func, paths: List[str], config: Config, window: Optional[int] = -1,
+                normalised: bool = True) -> Iterator:
+    """
+    Same as _map_paths, but yielding results one by one. Paths are processed by windows
+    (of a few paths per worker by default, None for all at once), so that only a few results
+    are held at once.
+    """
+    workers = config.corpus.workers
+    if workers == -1:
+        workers = os.cpu_count() or 1
+    if window == -1:
+        window = workers * 4
+    elif window is None:
+        window = max(len(paths), 1)
+
+    options = _cache_options(func, config, normalised)
+    cache = TextCache(config.corpus.cache_dir) if options is not None else None
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(paths) > 1 else None
+
+    try:
+        for i in range(0, len(paths), window):
+            batch = paths[i:i + window]
+            if cache is not None:
+                keys = [cache.key(path, options) for path in batch]
+                results = [cache.get(key) for key in keys]
+            else:
+                results = [None] * len(batch)
+
+            missing = [j for j, result in enumerate(results) if result is None]
+            missing_paths = [batch[j] for j in missing]
+            if executor is None:
+                computed = (func(path, config, normalised) for path in missing_paths)
+            else:
+                # archive members are read here, in archive order, and sent with their data
+                missing_paths = [path.with_data() if isinstance(path, ArchiveMember) else path
+                                 for path in missing_paths]
+                computed = executor.map(func, missing_paths, itertools.repeat(config), itertools.repeat(normalised),
+                                        chunksize=max(1, len(missing_paths) // (workers * 4)))
+
+            for j, result in zip(missing, computed):
+                if cache is not None:
+                    cache.put(keys[j], _without_units(result))
+                results[j] = result
+            yield from results
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.close()
+
+
+def _window_text(window: Sequence) -> str:
+    """Text of a sample, from its window over the normalised units of its document."""
+    return normalize_whitespace(' '.join(window))
+
+
+def _without_units(result):
+    """
+    Result of a loading function (e.g. to be cached), without the windows of overlapping samples over the units
+    of their document, that are only kept for counting, and would be stored for each sample.
+    The texts of these samples, left out by _normalise_documents, are made from their windows.
+    """
+    if isinstance(result, list):
+        return [_with_texts(document) if "units" in document else document for document in result]
+    return result
+
+
+def _with_texts(document: Dict) -> Dict:
+    with_texts = {key: value for key, value in document.items() if key not in ("units", "layer_units")}
+    if "layer_units" in document:
+        with_texts["layers"] = {layer: _window_text(document["layer_units"][layer]) if text is None else text
+                                for layer, text in document["layers"].items()}
+        with_texts["text"] = next(iter(with_texts["layers"].values()))
+    elif with_texts["text"] is None:
+        with_texts["text"] = _window_text(document["units"])
+    return with_texts
+
+
+def _load_document(path: str, config: Config, normalised: bool = True) -> Dict:
+    """
+    Load, and normalise (unless normalised is False, see _normalise_documents), a single document.
+    """
+    loader = LOADERS[config.corpus.format]
+    name = path.split('/')[-1]
+    layers = feature_layers(config)
+    if len(layers) > 1:
+        return _load_document_layers(path, layers, config, normalised)
+    author, text = loader.load(path, feats=config.features[0].type)
+
+    lang = detect_lang(text) if config.corpus.identify_lang else "NA"
+
+    # Normalize text
+    if normalised:
+        text = normalise(text, config.normalization)
+
+    return {
+        "name": name,
+        "aut": author,
+        "text": text,
+        "lang": lang
+    }
+
+
+def _load_document_layers(path: str, layers: List[str], config: Config, normalised: bool = True) -> Dict:
+    """
+    Load, and normalise, a single document with several annotation layers, from a single parse.
+    The text is the layer of the first feature, as in _load_document.
+    """
+    units = LOADERS[config.corpus.format].extract_layers(path, [("words", layer) for layer in layers])
+    texts = [normalize_whitespace(' '.join(layer_units)) for layer_units in units]
+
+    lang = detect_lang(texts[0]) if config.corpus.identify_lang else "NA"
+
+    texts = {layer: normalise(text, config.normalization) if normalised else text
+             for layer, text in zip(layers, texts)}
+
+    return {
+        "name": path.split('/')[-1],
+        "aut": extract_author_from_path(path),
+        "text": texts[layers[0]],
+        "lang": lang,
+        "layers": texts
+    }
+
+
+def _load_document_samples(path: str, config: Config, normalised: bool = True) -> List[Dict]:
+    """
+    Load the normalised samples of a single document (or their tokens, if normalised is False).
+    """
+    layers = feature_layers(config)
+    if len(layers) > 1:
+        return _load_document_layers_samples(path, layers, config, normalised)
+    author = extract_author_from_path(path)
+
+    # Detect language if needed, from the same parse as the samples
+    if config.corpus.identify_lang:
+        tokens, text = Sampler.extract_tokens_and_text(path, config)
+        lang = detect_lang(text)
+    else:
+        tokens = None
+        lang = 'NA'
+
+    # Get samples
+    samples = Sampler.get_samples(path, config, tokens=tokens)
+
+    return _samples_to_documents(samples, path.split('/')[-1], author, lang, config, normalised)
+
+
+def _load_document_layers_samples(path: str, layers: List[str], config: Config,
+                                  normalised: bool = True) -> List[Dict]:
+    """
+    Load the normalised samples of a single document with several annotation layers, from a single
+    parse. Units are aligned across layers, so that each sample covers the same units in every layer.
+    """
+    if not (config.corpus.format == "tei" or
+            (config.sampling.units == "verses" and config.corpus.format == "txm")):
+        raise ValueError(f"Unsupported combination: units={config.sampling.units}, format={config.corpus.format}")
+    config.sampling.validate()
+
+    requests = [(config.sampling.units, layer) for layer in layers]
+    if config.corpus.identify_lang:
+        # the text is made of words units, as in loader.load
+        requests.append(("words", layers[0]))
+    units = LOADERS[config.corpus.format].extract_layers(path, requests)
+    if any(len(layer_units) != len(units[0]) for layer_units in units[1:len(layers)]):
+        raise ValueError(f"Annotation layers {', '.join(layers)} are not aligned in {path}")
+
+    lang = detect_lang(normalize_whitespace(' '.join(units[-1]))) if config.corpus.identify_lang else "NA"
+
+    # samples of unit indices, applied to every layer
+    name = path.split('/')[-1]
+    samples = Sampler.create_samples(range(len(units[0])), config.sampling,
+                                     rng=Sampler.document_rng(config.sampling, name))
+    author = extract_author_from_path(path)
+    documents = []
+    for sample in samples:
+        texts = {layer: sample['text'].over(layer_units) for layer, layer_units in zip(layers, units)}
+        documents.append({
+            "name": f"{name}_{sample['start']}-{sample['end']}",
+            "aut": author,
+            "text": texts[layers[0]],
+            "lang": lang,
+            "layers": texts
+        })
+
+    return _normalise_documents(documents, config) if normalised else documents
+
+
+def _samples_to_documents(samples: List[Dict], name: str, author: str, lang: str, config: Config,
+                          normalised: bool = True) -> List[Dict]:
+    """
+    Create sample documents, with normalised texts (or their tokens, if normalised is False).
+    """
+    documents = []
+    for sample in samples:
+        documents.append({
+            "name": f"{name}_{sample['start']}-{sample['end']}",
+            "aut": author,
+            "text": sample['text'],
+            "lang": lang
+        })
+
+    return _normalise_documents(documents, config) if normalised else documents
+
+
+def _normalise_text(text, config: Config) -> str:
+    """
+    Normalise a text, or join and normalise the tokens of a sample.
+    """
+    if not isinstance(text, str):
+        text = ' '.join(text)
+    return normalise(text, config.normalization)
+
+
+def _shared_units(config: Config) -> bool:
+    """Whether the units of a document are shared by its samples: random samples, or overlapping windows."""
+    step = config.sampling.step
+    return config.sampling.random or (step is not None and step < config.sampling.size)
+
+
+def _normalise_window(window: Sequence, config: Config, normalised_units: Dict) -> Sequence:
+    """
+    Same sample window (TokenWindow or TokenSample) over the normalised units of the document, that are normalised
+    once for all its samples, instead of once per sample (normalised_units holds them, by units list; units in
+    no sample are left as None).
+    As normalisation works on characters and on runs of spaces, normalised units joined by spaces
+    (see _window_text) are the same text as the normalised joined units.
+    """
+    units = window.tokens
+    if id(units) not in normalised_units:
+        normalised_units[id(units)] = (units, [None] * len(units))
+    normalised = normalised_units[id(units)][1]
+    positions = range(window.start, window.end) if isinstance(window, TokenWindow) else window.indices.tolist()
+    missing = [i for i in dict.fromkeys(positions) if normalised[i] is None]
+    for i, unit in zip(missing, normalise_many([units[i] for i in missing], config.normalization)):
+        normalised[i] = unit
+    return window.over(normalised)
+
+
+def _normalise_documents(documents: List[Dict], config: Config) -> List[Dict]:
+    """
+    Normalise, in place, the texts of documents (or samples) loaded with normalised=False, e.g. after max_sampling,
+    so that only the selected documents are normalised.
+    Samples sharing the units of their document (see _shared_units) get, as units, their window over
+    the normalised units instead of a text, that is left out (None), so that it is only made when needed
+    (see _without_units and features_extract.document_text).
+    """
+    # units lists are kept with their normalised units, so that their ids are not reused
+    normalised_units = {}
+    for document in documents:
+        texts = document["layers"] if "layers" in document else {None: document["text"]}
+        windows = {}
+        for layer, text in texts.items():
+            if isinstance(text, (TokenWindow, TokenSample)) and _shared_units(config):
+                texts[layer], windows[layer] = None, _normalise_window(text, config, normalised_units)
+            else:
+                texts[layer] = _normalise_text(text, config)
+        # the text is the layer of the first feature
+        document["text"] = next(iter(texts.values()))
+        if windows:
+            document["units"] = next(iter(windows.values()))
+        if "layers" in document:
+            document["layers"] = texts
+            if windows:
+                document["layer_units"] = windows
+    return documents
+
+
+def _record_lang(record: Dict, text: str, config: Config) -> str:
+    if record["lang"] is not None:
+        return record["lang"]
+    return detect_lang(text) if config.corpus.identify_lang else "NA"
+
+
+def _load_records(path: str, config: Config, normalised: bool = True) -> List[Dict]:
+    """
+    Load, and normalise (unless normalised is False), the documents of a corpus container.
+    """
+    documents = []
+    for record in LOADERS[config.corpus.format].iter_records(path):
+        text = normalize_whitespace(record["text"])
+        documents.append({
+            "name": record["id"],
+            "aut": record["author"],
+            "text": normalise(text, config.normalization) if normalised else text,
+            "lang": _record_lang(record, text, config)
+        })
+    return documents
+
+
+def _load_records_samples(path: str, config: Config, normalised: bool = True) -> List[Dict]:
+    """
+    Load the normalised samples (or their tokens, if normalised is False) of the documents of a corpus container.
+    """
+    if config.sampling.units != "words":
+        raise ValueError(f"Unsupported combination: units={config.sampling.units}, format={config.corpus.format}")
+    config.sampling.validate()
+
+    documents = []
+    for record in LOADERS[config.corpus.format].iter_records(path):
+        text = normalize_whitespace(record["text"])
+        samples = Sampler.create_samples(Sampler.tokenize(text, config), config.sampling,
+                                         rng=Sampler.document_rng(config.sampling, record["id"]))
+        documents.extend(_samples_to_documents(samples, record["id"], record["author"],
+                                               _record_lang(record, text, config), config, normalised))
+    return documents
+
+
 def load_texts(paths: List[str], config: Config=Config()) -> List[Dict]:
     """
     Load a collection of documents.
     
     Args:
-        paths: List of file paths
+        paths: List of file paths (or archives, see archives.expand_archives)
         config: Config file
     
     Returns:
         List of document dictionaries
     """
-    loader = LOADERS.get(config.corpus.format)
-    if not loader:
+    if config.corpus.format not in LOADERS:
         raise ValueError(f"Unsupported format: {config.corpus.format}")
+    paths = expand_archives(paths)
     
-    documents = []
-    feats=config.features[0].type
+    # with max_samples, documents are selected before being normalised
+    normalised = config.sampling.max_samples is None
+    if isinstance(LOADERS[config.corpus.format], RecordLoader):
+        documents = [document for documents in _map_paths(_load_records, paths, config, normalised)
+                     for document in documents]
+    else:
+        documents = _map_paths(_load_document, paths, config, normalised)
 
-    for path in paths:
-        name = path.split('/')[-1]
-        author, text = loader.load(path, feats=feats)
-        
-        lang = detect_lang(text) if config.corpus.identify_lang else "NA"
-        
-        # Normalize text
-        text = normalise(text, config.normalization)
-        
-        documents.append({
-            "name": name,
-            "aut": author,
-            "text": text,
-            "lang": lang
-        })
-    
-    if config.sampling.max_samples is not None:
-        documents = max_sampling(documents, config.sampling.max_samples)
+    if not normalised:
+        documents = _normalise_documents(max_sampling(documents, config.sampling.max_samples,
+                                                      seed=config.sampling.seed), config)
     
     return documents
 
 
-def docs_to_samples(paths: List[str], config: Config=Config()) -> List[Dict]:
+def docs_to_samples(paths: List[str], config: Config=Config(), keep_units: bool = False) -> List[Dict]:
     """
     Load documents with sampling.
     
     Args:
-        paths: List of file paths
+        paths: List of file paths (or archives, see archives.expand_archives)
         config: Config file
+        keep_units: Keep, for overlapping samples, their window over the normalised units of
+            their document, as 'units', for incremental counting (see CountCache.count_windows),
+            with their text left out (None), to be made from it only when needed
+            (see features_extract.document_text)
     
     Returns:
         List of sample dictionaries
     """
-    loader = LOADERS.get(config.corpus.format)
-    if not loader:
+    if config.corpus.format not in LOADERS:
         raise ValueError(f"Unsupported format: {config.corpus.format}")
+    paths = expand_archives(paths)
     
-    all_samples = []
-    feats=config.features[0].type
+    load_samples = _load_records_samples if isinstance(LOADERS[config.corpus.format], RecordLoader) \
+        else _load_document_samples
+    # with max_samples, samples are selected before being joined and normalised
+    normalised = config.sampling.max_samples is None
+    all_samples = [sample for samples in _map_paths(load_samples, paths, config, normalised) for sample in samples]
 
-    for path in paths:
-        author = extract_author_from_path(path)
-        
-        # Detect language if needed
-        if config.corpus.identify_lang:
-            _, text = loader.load(path, feats=feats)
-            lang = detect_lang(text)
-        else:
-            lang = 'NA'
-        
-        # Get samples
-        samples = Sampler.get_samples(path, config)
-        
-        # Create sample documents
-        for sample in samples:
-            name = f"{path.split('/')[-1]}_{sample['start']}-{sample['end']}"
-            text = normalise(' '.join(sample['text']), config.normalization)
-            
-            all_samples.append({
-                "name": name,
-                "aut": author,
-                "text": text,
-                "lang": lang
-            })
+    if not normalised:
+        all_samples = _normalise_documents(max_sampling(all_samples, config.sampling.max_samples,
+                                                        seed=config.sampling.seed), config)
+    if not keep_units:
+        all_samples = _without_units(all_samples)
     
+    return all_samples
+
+
+def iter_texts(paths: List[str], config: Config=Config()) -> Iterator[Dict]:
+    """
+    Load documents (or samples, with config.sampling.enabled) one by one, as a generator,
+    so that the whole corpus is never held at once.
+    With max_samples, all documents have to be loaded first, to select them per author.
+
+    Args:
+        paths: List of file paths (or archives, see archives.expand_archives)
+        config: Config file
+
+    Yields:
+        Document (or sample) dictionaries, in the same order as load_texts or docs_to_samples
+    """
+    if config.corpus.format not in LOADERS:
+        raise ValueError(f"Unsupported format: {config.corpus.format}")
+    paths = expand_archives(paths)
+
     if config.sampling.max_samples is not None:
-        all_samples = max_sampling(all_samples, config.sampling.max_samples)
-    
-    return all_samples
\ No newline at end of file
+        if config.sampling.enabled:
+            yield from docs_to_samples(paths, config)
+        else:
+            yield from load_texts(paths, config)
+        return
+
+    records = isinstance(LOADERS[config.corpus.format], RecordLoader)
+    if config.sampling.enabled:
+        for samples in _iter_paths(_load_records_samples if records else _load_document_samples, paths, config):
+            yield from _without_units(samples)
+    elif records:
+        for documents in _iter_paths(_load_records, paths, config):
+            yield from documents
+    else:
+        yield from _iter_paths(_load_document, paths, config)
@@ -1,5 +1,10 @@
+import numpy
+import scipy.sparse
+import tqdm
+
 
 def count_process(args, embeddedFreqs=False):
+    """Legacy function, building one row of counts (see count_matrix)."""
     if embeddedFreqs:
         key = "embedded"
     else:
@@ -11,3 +16,40 @@ def count_process(args, embeddedFreqs=False):
         if word in feat_list:
             local_freqs[feat_list.index(word)] = value
     return text, local_freqs
+
+
+def count_matrix(myTexts, feat_list, embeddedFreqs=False):
+    """
+    Build the document-term matrix from the counts of a collection of texts, in one pass,
+    with each feature mapped to its column once (linear in the number of non-zero counts)
+    :param myTexts: the document collection, with counts
+    :param feat_list: the list of features, in column order
+    :param embeddedFreqs: whether to use the embedded frequencies instead of the counts
+    :return: a scipy.sparse CSR matrix, with one row per text and one column per feature
+    """
+    if embeddedFreqs:
+        key = "embedded"
+    else:
+        key = "wordCounts"
+
+    columns = {}
+    for i, feat in enumerate(feat_list):
+        columns.setdefault(feat, i)
+
+    indptr = numpy.zeros(len(myTexts) + 1, dtype=numpy.int64)
+    indices = []
+    data = []
+    for row, text in enumerate(tqdm.tqdm(myTexts)):
+        for word, value in text[key].items():
+            col = columns.get(word)
+            if col is not None:
+                indices.append(col)
+                data.append(value)
+        indptr[row + 1] = len(indices)
+
+    matrix = scipy.sparse.csr_matrix(
+        (numpy.asarray(data), numpy.asarray(indices, dtype=numpy.int32), indptr),
+        shape=(len(myTexts), len(feat_list))
+    )
+    matrix.sort_indices()
+    return matrix
@@ -1,7 +1,11 @@
+import hashlib
+import random
 import unidecode
 import langdetect
+import langdetect.detector_factory
 import unicodedata
 import regex as re
+from typing import Iterable, List
 
 from superstyl.config import NormalizationConfig
 
@@ -17,9 +21,144 @@ def normalize_whitespace(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
+# Words and punctuation, with the pattern and flags of nltk.tokenize.wordpunct_tokenize, compiled once
+WORDPUNCT = re.compile(r"\w+|[^\w\s]+", re.UNICODE | re.MULTILINE | re.DOTALL)
+
+
+def wordpunct_tokenize(text: str) -> List[str]:
+    """Split text into words and punctuation, as nltk.tokenize.wordpunct_tokenize."""
+    return WORDPUNCT.findall(text)
+
+
+# Language identification: bounded sample of texts, seed of langdetect, and number of cached results
+LANG_SAMPLE_CHARS = 10000
+LANG_SNIPPETS = 10
+LANG_SEED = 0
+LANG_CACHE_SIZE = 100000
+
+# Identified languages, by hash of the text sample
+_LANGS = {}
+
+
+def lang_sample(text: str, max_chars: int = LANG_SAMPLE_CHARS, snippets: int = LANG_SNIPPETS,
+                seed: int = LANG_SEED) -> str:
+    """
+    Bounded sample of a text for language identification: the text itself if it is short enough, or snippets
+    taken throughout it at random (seeded) positions, in text order, and cut at spaces.
+    """
+    if len(text) <= max_chars:
+        return text
+    size = max_chars // snippets
+    starts = sorted(random.Random(seed).sample(range(len(text) - size + 1), snippets))
+    pieces = []
+    for start in starts:
+        piece = text[start:start + size]
+        # not to begin or end in the middle of a word
+        first, last = piece.find(" "), piece.rfind(" ")
+        if 0 <= first < last:
+            piece = piece[first + 1:last]
+        pieces.append(piece)
+    return " ".join(pieces)
+
+
 def detect_lang(text: str) -> str:
-    """Detect language of text using langdetect."""
-    return langdetect.detect(text)
+    """
+    Detect language of text using langdetect, on a bounded sample of it (see lang_sample), with a fixed seed,
+    so that results are reproducible. Results are cached by hash of the sample.
+    """
+    sample = lang_sample(text)
+    key = hashlib.blake2b(sample.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    if key not in _LANGS:
+        langdetect.detector_factory.init_factory()
+        detector = langdetect.detector_factory._factory.create()
+        detector.seed = LANG_SEED
+        detector.append(sample)
+        lang = detector.detect()
+        if len(_LANGS) >= LANG_CACHE_SIZE:
+            _LANGS.clear()
+        _LANGS[key] = lang
+    return _LANGS[key]
+
+
+class Normaliser:
+    """
+    Text normalisation for a NormalizationConfig, compiled once: characters out of the kept classes are replaced
+    by spaces and (unless no_ascii or keep_sym) converted to ASCII, through a single translation table,
+    filled lazily for each code point (as both the filter and unidecode work on single characters).
+    ASCII characters are translated on the UTF-8 bytes of the text, and only runs of other characters
+    go through the table.
+    """
+
+    NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+    def __init__(self, norm_config: NormalizationConfig=NormalizationConfig()):
+        if norm_config.keep_sym:
+            kept = r"[\p{L}\p{P}\p{N}\p{S}\p{M}\p{Co}]"
+        elif norm_config.keep_punct:
+            kept = r"[\p{L}\p{P}\p{M}]"
+        else:
+            kept = r"[\p{L}\p{M}]"
+        self.kept = re.compile(kept)
+        self.lower = not norm_config.keep_sym and not norm_config.keep_punct
+        self.ascii = not norm_config.keep_sym and not norm_config.no_ascii
+        self.table = _TranslationTable(self)
+        # bytes of non ASCII characters are left as they are
+        self.ascii_table = bytes(ord(self.translate(chr(byte))) if byte < 128 else byte for byte in range(256))
+
+    def translate(self, char: str) -> str:
+        """Replacement of a single character."""
+        if not self.kept.match(char):
+            return " "
+        return unidecode.unidecode(char) if self.ascii else char
+
+    def normalise(self, text: str) -> str:
+        if self.lower:
+            text = text.lower()
+        data = text.encode("utf-8", "surrogatepass")
+        out = data.translate(self.ascii_table).decode("utf-8", "surrogatepass")
+        if len(data) != len(text):
+            if (len(data) - len(text)) * 16 < len(text):
+                # few non ASCII characters: only their runs are translated
+                runs = self.NON_ASCII.findall(out)
+                pieces = [None] * (2 * len(runs) + 1)
+                pieces[0::2] = self.NON_ASCII.split(out)
+                pieces[1::2] = [run.translate(self.table) for run in runs]
+                out = "".join(pieces)
+            else:
+                # (ASCII characters are translated again, to themselves)
+                out = out.translate(self.table)
+            if not out.isascii() and not unicodedata.is_normalized("NFC", out):
+                out = unicodedata.normalize("NFC", out)
+        # the only spaces left are the ones from the table (or from unidecode)
+        return " ".join(out.split())
+
+    def normalise_many(self, texts: Iterable[str]) -> List[str]:
+        return [self.normalise(text) for text in texts]
+
+
+class _TranslationTable(dict):
+    """Translation table of a Normaliser, by code point, filled as characters are met."""
+
+    def __init__(self, normaliser: Normaliser):
+        super().__init__()
+        self.normaliser = normaliser
+
+    def __missing__(self, code_point: int) -> str:
+        replacement = self.normaliser.translate(chr(code_point))
+        self[code_point] = replacement
+        return replacement
+
+
+# Normalisers by options, to be compiled only once
+_NORMALISERS = {}
+
+
+def get_normaliser(norm_config: NormalizationConfig=NormalizationConfig()) -> Normaliser:
+    """Normaliser for a NormalizationConfig, shared by all the configs with the same options."""
+    key = (norm_config.keep_punct, norm_config.keep_sym, norm_config.no_ascii)
+    if key not in _NORMALISERS:
+        _NORMALISERS[key] = Normaliser(norm_config)
+    return _NORMALISERS[key]
 
 
 def normalise(text: str, norm_config : NormalizationConfig=NormalizationConfig()) -> str:
@@ -35,16 +174,11 @@ def normalise(text: str, norm_config : NormalizationConfig=NormalizationConfig()
     Returns:
         Normalized text
     """
-    if norm_config.keep_sym:
-        out = re.sub(r"[^\p{L}\p{P}\p{N}\p{S}\p{M}\p{Co}]+", " ", text)
-    else:
-        if norm_config.keep_punct:
-            out = re.sub(r"[^\p{L}\p{P}\p{M}]+", " ", text)
-        else:
-            out = re.sub(r"[^\p{L}\p{M}]+", " ", text.lower())
-        
-        if not norm_config.no_ascii:
-            out = unidecode.unidecode(out)
-    
-    out = unicodedata.normalize("NFC", out)
-    return normalize_whitespace(out)
\ No newline at end of file
+    return get_normaliser(norm_config).normalise(text)
+
+
+def normalise_many(texts: Iterable[str], norm_config : NormalizationConfig=NormalizationConfig()) -> List[str]:
+    """
+    Normalize a batch of texts, as normalise.
+    """
+    return get_normaliser(norm_config).normalise_many(texts)
@@ -12,14 +12,15 @@ import imblearn.over_sampling as over
 import imblearn.combine as comb
 import imblearn.pipeline as imbp
 from collections import Counter
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 
 from superstyl.config import Config
+from superstyl.load import SparseCorpus
 
 
 def train_svm(
-    train: pandas.DataFrame,
-    test: Optional[pandas.DataFrame] = None,
+    train: Union[pandas.DataFrame, SparseCorpus],
+    test: Optional[Union[pandas.DataFrame, SparseCorpus]] = None,
     config: Optional[Config] = None,
     **kwargs
 ) -> Dict[str, Any]:
@@ -32,8 +33,9 @@ def train_svm(
        train_svm(train, test, cross_validate="k-fold", k=10)
     
     Args:
-        train: Training data (pandas DataFrame)
-        test: Test data (optional)
+        train: Training data (pandas DataFrame, or SparseCorpus to train
+               without densifying the document-term matrix)
+        test: Test data (optional, same type as train)
         config: Configuration object. If None, built from kwargs.
         **kwargs: Individual parameters for backward compatibility.
                   Supported: cross_validate, k, dim_reduc, norms, balance,
@@ -61,14 +63,28 @@ def train_svm(
     results = {}
 
     print(".......... Formatting data ........")
+    sparse = isinstance(train, SparseCorpus)
     # Save the classes
-    classes = list(train.loc[:, 'author'])
-    train = train.drop(['author', 'lang'], axis=1)
+    if sparse:
+        classes = list(train.metadata.loc[:, 'author'])
+        train_index = train.index
+        feature_names = pandas.Index(train.features)
+        train = train.matrix
+    else:
+        classes = list(train.loc[:, 'author'])
+        train = train.drop(['author', 'lang'], axis=1)
+        train_index = train.index
+        feature_names = train.columns
 
     if test is not None:
-        classes_test = list(test.loc[:, 'author'])
-        test = test.drop(['author', 'lang'], axis=1)
-        preds_index = list(test.index)
+        if isinstance(test, SparseCorpus):
+            classes_test = list(test.metadata.loc[:, 'author'])
+            preds_index = list(test.index)
+            test = test.matrix
+        else:
+            classes_test = list(test.loc[:, 'author'])
+            test = test.drop(['author', 'lang'], axis=1)
+            preds_index = list(test.index)
 
     cw = None
     if class_weights:
@@ -84,7 +100,8 @@ def train_svm(
 
     if norms:
         print(".......... using normalisations ........")
-        estimators.append(('scaler', preproc.StandardScaler()))
+        # centering would densify sparse data
+        estimators.append(('scaler', preproc.StandardScaler(with_mean=not sparse)))
         estimators.append(('normalizer', preproc.Normalizer()))
 
     if balance is not None:
@@ -173,7 +190,7 @@ def train_svm(
             myCV = skmodel.KFold(n_splits=k)
 
         if cross_validate == 'group-k-fold':
-            works = ["_".join(t.split("_")[:-1]) for t in train.index.values]
+            works = ["_".join(t.split("_")[:-1]) for t in train_index.values]
             if k == 0:
                 k = len(set(works))
             myCV = skmodel.GroupKFold(n_splits=k)
@@ -198,7 +215,7 @@ def train_svm(
 
         # misattributions
         results["misattributions"] = pandas.DataFrame(
-            [i for i in zip(list(train.index), list(classes), list(preds)) if i[1] != i[2]],
+            [i for i in zip(list(train_index), list(classes), list(preds)) if i[1] != i[2]],
             columns=["id", "True", "Pred"]
         ).set_index('id')
 
@@ -234,7 +251,7 @@ def train_svm(
 
             # misattributions
             results["misattributions"] = pandas.DataFrame(
-                [i for i in zip(list(train.index), list(classes), list(preds)) if i[1] != i[2]],
+                [i for i in zip(list(train_index), list(classes), list(preds)) if i[1] != i[2]],
                 columns=["id", "True", "Pred"]
             ).set_index('id')
 
@@ -269,21 +286,21 @@ def train_svm(
                 results["coefficients"] = pandas.DataFrame(
                     pipe.named_steps['model'].coef_,
                     index=[pipe.classes_[0]],
-                    columns=train.columns
+                    columns=feature_names
                 )
                 plot_coefficients(
                     pipe.named_steps['model'].coef_[0],
-                    train.columns,
+                    feature_names,
                     f"{pipe.classes_[0]} versus {pipe.classes_[1]}"
                 )
             else:
                 results["coefficients"] = pandas.DataFrame(
                     pipe.named_steps['model'].coef_,
                     index=pipe.classes_,
-                    columns=train.columns
+                    columns=feature_names
                 )
                 for i in range(len(pipe.classes_)):
-                    plot_coefficients(pipe.named_steps['model'].coef_[i], train.columns, pipe.classes_[i])
+                    plot_coefficients(pipe.named_steps['model'].coef_[i], feature_names, pipe.classes_[i])
 
     results["pipeline"] = pipe
 
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import superstyl
 import superstyl.preproc
 import superstyl.preproc.pipe
@@ -6,9 +7,27 @@ import superstyl.preproc.features_extract
 import superstyl.preproc.embedding
 import superstyl.preproc.select
 import superstyl.preproc.text_count
-from superstyl.config import NormalizationConfig, Config
+import superstyl.preproc.utils
+from superstyl.config import NormalizationConfig, Config, FeatureConfig, SamplingConfig
 import os
 import glob
+import collections
+import concurrent.futures
+import json
+import random
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import nltk.tokenize
+import numpy
+import scipy.sparse
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -361,6 +380,166 @@ class Main(unittest.TestCase):
         # Just testing that a lang is predicted, not if it is ok or not
         self.assertEqual(len([text for text in results if text["lang"] != 'NA']), 3)
 
+    def test_load_texts_parallel(self):
+        # SCENARIO: loading over a process pool gives the same documents, in the same order, as the serial path
+        for kwargs in [{}, {"sampling": True, "size": 2, "step": 1, "keep_punct": True}]:
+            # GIVEN
+            serial_config = Config.from_kwargs(format="txt", **kwargs)
+            parallel_config = Config.from_kwargs(format="txt", load_workers=2, **kwargs)
+            load = superstyl.preproc.pipe.docs_to_samples if kwargs else superstyl.preproc.pipe.load_texts
+            # WHEN
+            results = load(self.paths, parallel_config)
+            # THEN
+            self.assertEqual(results, load(self.paths, serial_config))
+
+        # WHEN/THEN
+        with self.assertRaises(ValueError):
+            Config.from_kwargs(load_workers=0)
+
+    def test_load_texts_cache(self):
+        # SCENARIO: loaded and normalised texts are cached on disk, and reused by later runs
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # GIVEN
+            paths = []
+            for path in self.paths:
+                paths.append(os.path.join(temp_dir, os.path.basename(path)))
+                shutil.copy(path, paths[-1])
+            cache_dir = os.path.join(temp_dir, "cache")
+            config = Config.from_kwargs(format="txt", cache_dir=cache_dir)
+            expected = superstyl.preproc.pipe.load_texts(paths, config)
+            # WHEN
+            with unittest.mock.patch.object(superstyl.preproc.pipe.LOADERS["txt"], "load") as mocked:
+                results = superstyl.preproc.pipe.load_texts(paths, config)
+            # THEN
+            mocked.assert_not_called()
+            self.assertEqual(results, expected)
+
+            # WHEN
+            results = superstyl.preproc.pipe.load_texts(paths, Config.from_kwargs(format="txt", keep_punct=True,
+                                                                                  cache_dir=cache_dir))
+            # THEN
+            self.assertEqual(results[0]["text"], "Voici le texte!")
+
+            # GIVEN
+            with open(paths[0], "w") as f:
+                f.write("Un autre texte")
+            # WHEN
+            results = superstyl.preproc.pipe.load_texts(paths, config)
+            # THEN
+            self.assertEqual(results[0]["text"], "un autre texte")
+            self.assertEqual(results[1:], expected[1:])
+
+            # WHEN
+            config = Config.from_kwargs(format="txt", sampling=True, size=2, cache_dir=cache_dir)
+            expected = superstyl.preproc.pipe.docs_to_samples(paths, config)
+            with unittest.mock.patch.object(superstyl.preproc.pipe.LOADERS["txt"], "load") as mocked:
+                results = superstyl.preproc.pipe.docs_to_samples(paths, config)
+            # THEN
+            mocked.assert_not_called()
+            self.assertEqual(results, expected)
+
+    def _records(self):
+        records = []
+        for path in self.paths:
+            with open(path) as f:
+                records.append({"id": os.path.basename(path), "author": os.path.basename(path).split("_")[0],
+                                "text": f.read()})
+        records[0]["lang"] = "fr"
+        return records
+
+    def test_load_texts_jsonl(self):
+        # SCENARIO: documents are read from records of a JSONL corpus, as from one file per document
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # GIVEN
+            records = self._records()
+            path = os.path.join(temp_dir, "corpus.jsonl")
+            with open(path, "w") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+            for kwargs in [{}, {"sampling": True, "size": 2, "keep_punct": True}]:
+                load = superstyl.preproc.pipe.docs_to_samples if kwargs else superstyl.preproc.pipe.load_texts
+                # WHEN
+                results = load([path], Config.from_kwargs(format="jsonl", **kwargs))
+                # THEN
+                expected = load(self.paths, Config.from_kwargs(format="txt", **kwargs))
+                for document in expected:
+                    if document["name"].startswith("Dupont"):
+                        document["lang"] = "fr"
+                self.assertEqual(results, expected)
+
+            # WHEN
+            corpus, feats = superstyl.load.load_corpus(data_paths=[path], format="jsonl", feats="chars", n=2)
+            # THEN
+            expected_corpus, expected_feats = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=2)
+            self.assertEqual(feats, expected_feats)
+            self.assertEqual(corpus.drop(columns="lang").to_dict(), expected_corpus.drop(columns="lang").to_dict())
+
+            # GIVEN
+            with open(path, "w") as f:
+                f.write(json.dumps({"id": "1", "text": "No author"}) + "\n")
+            # WHEN/THEN
+            with self.assertRaises(ValueError):
+                superstyl.preproc.pipe.load_texts([path], Config.from_kwargs(format="jsonl"))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not available")
+    def test_load_texts_parquet(self):
+        # SCENARIO: documents are read from records of a Parquet corpus, as from one file per document
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # GIVEN
+            records = self._records()
+            path = os.path.join(temp_dir, "corpus.parquet")
+            pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), path, row_group_size=2)
+            # WHEN
+            with unittest.mock.patch.object(superstyl.preproc.pipe.LOADERS["parquet"], "batch_size", 2):
+                results = superstyl.preproc.pipe.load_texts([path], Config.from_kwargs(format="parquet"))
+            # THEN
+            expected = superstyl.preproc.pipe.load_texts(self.paths, Config.from_kwargs(format="txt"))
+            expected[0]["lang"] = "fr"
+            self.assertEqual(results, expected)
+
+    def test_load_texts_archives(self):
+        # SCENARIO: documents are read from zip and tar.gz archives, without extracting them
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # GIVEN
+            zip_path = os.path.join(temp_dir, "corpus.zip")
+            with zipfile.ZipFile(zip_path, "w") as zip_file:
+                for path in self.paths:
+                    zip_file.write(path, "texts/" + os.path.basename(path))
+            tar_path = os.path.join(temp_dir, "corpus.tar.gz")
+            with tarfile.open(tar_path, "w:gz") as tar_file:
+                for path in self.paths:
+                    tar_file.add(path, "texts/" + os.path.basename(path))
+            config = Config.from_kwargs(format="txt")
+            expected = superstyl.preproc.pipe.load_texts(self.paths, config)
+            for archive in [zip_path, tar_path]:
+                # WHEN
+                results = superstyl.preproc.pipe.load_texts([archive], config)
+                # THEN
+                self.assertEqual(results, expected)
+
+                # WHEN
+                results = superstyl.preproc.pipe.load_texts([archive + "!texts/Smith_*"],
+                                                            Config.from_kwargs(format="txt", load_workers=2))
+                # THEN
+                self.assertEqual(results, expected[1:])
+
+                # WHEN
+                results = superstyl.preproc.pipe.docs_to_samples(
+                    [archive], Config.from_kwargs(format="txt", sampling=True, size=2, cache_dir=temp_dir))
+                # THEN
+                self.assertEqual(results, superstyl.preproc.pipe.docs_to_samples(
+                    self.paths, Config.from_kwargs(format="txt", sampling=True, size=2)))
+
+            # GIVEN
+            tei_path = os.path.join(THIS_DIR, "testdata", "Dupont_TEIPoem1.xml")
+            with zipfile.ZipFile(zip_path, "w") as zip_file:
+                zip_file.write(tei_path, os.path.basename(tei_path))
+            # WHEN
+            results = superstyl.preproc.pipe.docs_to_samples(
+                [zip_path], Config.from_kwargs(format="tei", sampling=True, units="verses", size=1))
+            # THEN
+            self.assertEqual(results, superstyl.preproc.pipe.docs_to_samples(
+                [tei_path], Config.from_kwargs(format="tei", sampling=True, units="verses", size=1)))
+
     #TODO: test other loading formats, that are not txt (and decide on their implementation)
 
     def test_docs_to_samples(self):
@@ -442,6 +621,212 @@ class Main(unittest.TestCase):
                             format="txt", max_samples=None,
                             samples_random=True)
 
+    def test_random_sampling_seed(self):
+        # FEATURE: random samples are reproducible with a seed, whatever the order in which documents are loaded
+        # GIVEN
+        config = Config.from_kwargs(size=3, units="words", format="txt", sampling=True, max_samples=4,
+                                    samples_random=True, samples_seed=7)
+        # WHEN
+        results = superstyl.preproc.pipe.docs_to_samples(self.paths, config)
+        # THEN
+        self.assertEqual(results, superstyl.preproc.pipe.docs_to_samples(self.paths, config))
+        self.assertEqual(results, superstyl.preproc.pipe.docs_to_samples(self.paths, Config.from_kwargs(
+            size=3, units="words", format="txt", sampling=True, max_samples=4, samples_random=True, samples_seed=7,
+            load_workers=2)))
+        self.assertEqual([text for text in results if text["aut"] == 'Dupont'],
+                         superstyl.preproc.pipe.docs_to_samples(self.paths[:1], config))
+        self.assertEqual(len([text for text in results if text["aut"] == 'Smith']), 4)
+
+        # GIVEN no sampling seed
+        config = Config.from_kwargs(size=3, units="words", format="txt", sampling=True, max_samples=4,
+                                    samples_random=True)
+        # WHEN
+        runs = []
+        for _ in range(2):
+            random.seed(42)
+            runs.append(superstyl.preproc.pipe.docs_to_samples(self.paths, config))
+        # THEN samples are still reproducible with random.seed
+        self.assertEqual(runs[0], runs[1])
+
+        # WHEN
+        samples = superstyl.preproc.pipe.Sampler.create_samples(["a", "b", "c"], config.sampling)
+        # THEN: tokens are drawn as indices
+        self.assertEqual(len(samples), 4)
+        self.assertTrue(all(len(sample["text"]) == 3 and set(sample["text"]) <= {"a", "b", "c"} for sample in samples))
+        indices, multiplicities = samples[0]["text"].multiplicities()
+        self.assertEqual(sum(multiplicities), 3)
+        self.assertEqual(list(indices), list(dict.fromkeys(samples[0]["text"].indices.tolist())))
+
+        # WHEN: counting samples from the multiplicities of their units
+        results = superstyl.preproc.pipe.docs_to_samples(self.paths, Config.from_kwargs(
+            size=3, units="words", format="txt", sampling=True, max_samples=4, samples_random=True, samples_seed=7),
+            keep_units=True)
+        cache = superstyl.preproc.features_extract.CountCache()
+        cache.count_windows(results, feats="words", n=1)
+        # THEN
+        texts = [superstyl.preproc.features_extract.document_text(r) for r in results]
+        self.assertEqual(cache.count_documents(results),
+                         [superstyl.preproc.features_extract.count_features(text) for text in texts])
+
+        # THEN
+        with self.assertRaises(ValueError):
+            SamplingConfig(seed=-1)
+
+    def test_load_corpus_sparse(self):
+        # FEATURE: get a sparse document-term matrix instead of a dense data frame
+        # WHEN
+        corpus, feats = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=3, sparse=True)
+        dense_corpus, dense_feats = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=3)
+        # THEN
+        self.assertIsInstance(corpus, superstyl.SparseCorpus)
+        self.assertEqual(corpus.matrix.shape, (3, len(feats)))
+        self.assertEqual(corpus.matrix.nnz, sum(1 for v in dense_corpus.iloc[:, 2:].to_numpy().flat if v != 0))
+        self.assertEqual(feats, dense_feats)
+        self.assertEqual(corpus.to_dataframe().to_dict(), dense_corpus.to_dict())
+
+        # WHEN
+        config = Config.from_dict({
+            'corpus': {'paths': self.paths, 'sparse': True},
+            'features': [{'name': 'w', 'type': 'words'}, {'name': 'c', 'type': 'chars', 'n': 2}]
+        })
+        corpus, feats = superstyl.load.load_corpus(config=config)
+        config.corpus.sparse = False
+        dense_corpus, dense_feats = superstyl.load.load_corpus(config=config)
+        # THEN
+        self.assertEqual(feats, dense_feats)
+        self.assertEqual(corpus.to_dataframe().to_dict(), dense_corpus.to_dict())
+
+    def test_load_corpus_hashing(self):
+        # FEATURE: hash features into a fixed number of buckets, without a feature list
+        # WHEN
+        corpus, feats = superstyl.load.load_corpus(data_paths=self.paths, feats="words", n=1, hashing=64,
+                                                   freqsType="absolute")
+        # THEN
+        self.assertIsNone(feats)
+        self.assertEqual(list(corpus.columns), ['author', 'lang'] + [f"hash_{i}" for i in range(64)])
+        self.assertEqual(corpus.iloc[:, 2:].sum(axis=1).to_dict(),
+                         {'Dupont_Letter1.txt': 3, 'Smith_Letter1.txt': 4, 'Smith_Letter2.txt': 5})
+
+        # WHEN a document is vectorized on its own
+        single, _ = superstyl.load.load_corpus(data_paths=self.paths[0:1], feats="words", n=1, hashing=64,
+                                               freqsType="absolute", sparse=True)
+        # THEN
+        self.assertEqual(single.matrix.toarray()[0].tolist(), corpus.iloc[0, 2:].tolist())
+
+        # WHEN
+        corpus, _ = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=3, hashing=16,
+                                               freqsType="binary")
+        # THEN
+        self.assertTrue(set(corpus.iloc[:, 2:].to_numpy().flat) <= {0, 1})
+
+        # THEN
+        with self.assertRaises(ValueError):
+            Config.from_kwargs(data_paths=self.paths, hashing=64, culling=50)
+
+    def test_load_corpus_n_range(self):
+        # FEATURE: extract several n-grams lengths in a single pass
+        for feats in ["chars", "words"]:
+            # WHEN
+            with unittest.mock.patch("superstyl.preproc.features_extract.count_features",
+                                     side_effect=superstyl.preproc.features_extract.count_features) as mocked:
+                corpus, feat_list = superstyl.load.load_corpus(data_paths=self.paths, feats=feats, n=[2, 3], k=5)
+            corpus2, feat_list2 = superstyl.load.load_corpus(data_paths=self.paths, feats=feats, n=2, k=5)
+            corpus3, feat_list3 = superstyl.load.load_corpus(data_paths=self.paths, feats=feats, n=3, k=5)
+            # THEN
+            mocked.assert_not_called()
+            self.assertEqual(feat_list, feat_list2 + feat_list3)
+            self.assertEqual(corpus.to_dict(), {**corpus2.to_dict(), **corpus3.to_dict()})
+
+        # WHEN
+        corpus, feat_list = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=[2, 3], k=5,
+                                                       k_per_order=False, freqsType="absolute")
+        # THEN
+        expected = superstyl.preproc.features_extract.get_feature_list(
+            superstyl.preproc.pipe.load_texts(self.paths), feats="chars", n=[2, 3], freqsType="absolute")
+        self.assertEqual(feat_list, [f for f in expected if f[1] >= expected[4][1]])
+        self.assertEqual(len(corpus.columns), len(feat_list) + 2)
+
+        # GIVEN a feature found with several lengths of a range
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "Smith_Letter1.txt")
+            with open(path, "w") as f:
+                f.write("the_cat the cat")
+            for k_per_order in [True, False]:
+                kwargs = {"feats": "words", "n": [1, 2], "k": 10, "k_per_order": k_per_order,
+                          "freqsType": "absolute", "keep_punct": True}
+                # WHEN
+                corpus, feat_list = superstyl.load.load_corpus(data_paths=[path], **kwargs)
+                documents, iter_feat_list = superstyl.load.load_corpus_iter(data_paths=[path], **kwargs)
+                documents = list(documents)
+                # THEN it is selected once, with its counts for each length added up
+                features = [f[0] for f in feat_list]
+                self.assertEqual(len(features), len(set(features)))
+                self.assertEqual(list(corpus.columns), ["author", "lang"] + features)
+                self.assertEqual(dict(feat_list)["the_cat"], 2)
+                self.assertEqual(corpus["the_cat"].tolist(), [2])
+                self.assertEqual(iter_feat_list, feat_list)
+                self.assertEqual([list(d["vector"]) for d in documents], corpus.iloc[:, 2:].values.tolist())
+
+        # THEN
+        with self.assertRaises(ValueError):
+            Config.from_kwargs(data_paths=self.paths, n=[3, 2])
+        with self.assertRaises(ValueError):
+            Config.from_kwargs(data_paths=self.paths, feats="affixes", n=[2, 3])
+
+    def test_load_corpus_iter(self):
+        # FEATURE: stream documents one by one, with the same features as load_corpus
+        for kwargs in [{"feats": "chars", "n": 3}, {"feats": "words", "n": [1, 2], "k": 3},
+                       {"feats": "chars", "n": 2, "feat_list": [("th", 0), ("xx", 0)]},
+                       {"feats": "chars", "n": 3, "hashing": 16},
+                       {"feats": "words", "sampling": True, "size": 2, "freqsType": "absolute"}]:
+            # WHEN
+            documents, feat_list = superstyl.load.load_corpus_iter(data_paths=self.paths, **kwargs)
+            documents = list(documents)
+            # THEN
+            corpus, expected_feats = superstyl.load.load_corpus(data_paths=self.paths, **kwargs)
+            self.assertEqual(feat_list, expected_feats)
+            self.assertEqual([d["name"] for d in documents], list(corpus.index))
+            self.assertEqual([d["aut"] for d in documents], list(corpus["author"]))
+            self.assertEqual([list(d["vector"]) for d in documents], corpus.iloc[:, 2:].values.tolist())
+
+        # GIVEN
+        config = Config(
+            corpus=superstyl.CorpusConfig(paths=self.paths, sparse=True),
+            features=[superstyl.FeatureConfig(type="words"), superstyl.FeatureConfig(type="chars", n=2)]
+        )
+        # WHEN
+        documents, feat_lists = superstyl.load.load_corpus_iter(config)
+        # THEN
+        corpus, expected_feats = superstyl.load.load_corpus(config)
+        self.assertEqual(feat_lists, expected_feats)
+        self.assertEqual(scipy.sparse.vstack([d["vector"] for d in documents]).toarray().tolist(),
+                         corpus.matrix.toarray().tolist())
+
+        # THEN
+        with self.assertRaises(ValueError):
+            superstyl.load.load_corpus_iter(data_paths=self.paths, culling=50)
+
+    def test_load_corpus_layers(self):
+        # SCENARIO: each feature of a multi-feature TEI config is counted on its own annotation layer
+        # GIVEN
+        tei_paths = [os.path.join(THIS_DIR, "testdata", "Dupont_TEIPoem1.xml")]
+        config = Config(
+            corpus=superstyl.CorpusConfig(paths=tei_paths, format="tei"),
+            features=[superstyl.FeatureConfig(type="words", name="w"), superstyl.FeatureConfig(type="lemma", name="l"),
+                      superstyl.FeatureConfig(type="pos", name="p")]
+        )
+        # WHEN
+        corpus, feat_lists = superstyl.load.load_corpus(config)
+        documents, iter_feat_lists = superstyl.load.load_corpus_iter(config)
+        # THEN
+        for prefix, feats, feat_list in zip("wlp", ["words", "lemma", "pos"], feat_lists):
+            expected, expected_feats = superstyl.load.load_corpus(data_paths=tei_paths, format="tei", feats=feats)
+            self.assertEqual(feat_list, expected_feats)
+            self.assertEqual(corpus[[f"{prefix}_{f}" for f in expected.columns[2:]]].values.tolist(),
+                             expected.iloc[:, 2:].values.tolist())
+        self.assertEqual(iter_feat_lists, feat_lists)
+        self.assertEqual([list(d["vector"]) for d in documents], corpus.iloc[:, 2:].values.tolist())
+
     # TODO: test other loading formats with sampling, that are not txt (and decide on their implementation)
 
     # Testing the processing of "myTexts" objects
@@ -567,6 +952,167 @@ class Main(unittest.TestCase):
 
         self.assertEqual(results, expected)
 
+        # GIVEN a feature found with several lengths of a range
+        myTexts = [{'name': 'Letter1', 'aut': 'Smith', 'text': 'the_cat the cat', 'lang': 'en'}]
+        for freqsType, expected in [("absolute", 2), ("relative", 1 / 3 + 1 / 2), ("binary", 1)]:
+            # WHEN
+            results = superstyl.preproc.features_extract.get_counts([dict(t) for t in myTexts], feats="words",
+                                                                    n=[1, 2], freqsType=freqsType)
+            # THEN its counts for each length are added up
+            self.assertEqual(results[0]["wordCounts"]["the_cat"], expected)
+
+
+    def test_count_cache(self):
+        # SCENARIO: feature list and counts extraction share a single tokenization pass
+        # GIVEN
+        myTexts = [
+            {"name": "Letter1", "aut": "Smith", "text": "This is the text", "lang": "en"},
+            {"name": "Letter2", "aut": "Smith", "text": "This is also the text", "lang": "en"},
+            {"name": "Letter1", "aut": "Dupont", "text": "Voici le texte", "lang": "fr"},
+        ]
+        cache = superstyl.preproc.features_extract.CountCache()
+        count_features = superstyl.preproc.features_extract.count_features
+        # WHEN
+        with unittest.mock.patch("superstyl.preproc.features_extract.count_features",
+                                 side_effect=count_features) as mocked:
+            feat_list = superstyl.preproc.features_extract.get_feature_list(myTexts, feats="chars", n=2,
+                                                                            freqsType="relative", cache=cache)
+            results = superstyl.preproc.features_extract.get_counts([dict(t) for t in myTexts],
+                                                                    feat_list=[f[0] for f in feat_list],
+                                                                    feats="chars", n=2, freqsType="relative",
+                                                                    cache=cache)
+        # THEN
+        self.assertEqual(mocked.call_count, 3)
+        self.assertEqual(feat_list, superstyl.preproc.features_extract.get_feature_list(
+            myTexts, feats="chars", n=2, freqsType="relative"))
+        self.assertEqual(results, superstyl.preproc.features_extract.get_counts(
+            [dict(t) for t in myTexts], feat_list=[f[0] for f in feat_list], feats="chars", n=2,
+            freqsType="relative"))
+
+        # WHEN
+        results = superstyl.preproc.features_extract.get_counts([dict(t) for t in myTexts], feats="chars", n=2,
+                                                                freqsType="relative", cache=cache)
+        # THEN cached counts are left untouched by frequency computation
+        self.assertEqual(cache.count_features("This is the text", feats="chars", n=2)[0]["is"], 2)
+        self.assertEqual(results[0]["wordCounts"]["is"], 2/15)
+
+
+    def test_parallel_counts(self):
+        # SCENARIO: counting over a process pool gives the same output as the serial path
+        # GIVEN
+        myTexts = [
+            {"name": "Letter1", "aut": "Smith", "text": "This is the text", "lang": "en"},
+            {"name": "Letter2", "aut": "Smith", "text": "This is also the text", "lang": "en"},
+            {"name": "Letter1", "aut": "Dupont", "text": "Voici le texte", "lang": "fr"},
+        ]
+        fex = superstyl.preproc.features_extract
+        for feats, n in [("words", 1), ("chars", 3), ("affixes", 3)]:
+            # WHEN
+            serial = fex.get_feature_list(myTexts, feats=feats, n=n, freqsType="relative")
+            parallel = fex.get_feature_list(myTexts, feats=feats, n=n, freqsType="relative", workers=2)
+            cached = fex.get_feature_list(myTexts, feats=feats, n=n, freqsType="relative", workers=2,
+                                          cache=fex.CountCache())
+            # THEN
+            self.assertEqual(parallel, serial)
+            self.assertEqual(cached, serial)
+
+            # WHEN
+            serial = fex.get_counts([dict(t) for t in myTexts], feats=feats, n=n, freqsType="absolute")
+            parallel = fex.get_counts([dict(t) for t in myTexts], feats=feats, n=n, freqsType="absolute", workers=2)
+            # THEN
+            self.assertEqual(parallel, serial)
+
+        # WHEN
+        corpus, feats = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=3, workers=2)
+        expected_corpus, expected_feats = superstyl.load.load_corpus(data_paths=self.paths, feats="chars", n=3)
+        # THEN
+        self.assertEqual(feats, expected_feats)
+        self.assertEqual(corpus.to_dict(), expected_corpus.to_dict())
+
+        # GIVEN more texts than a window of chunks
+        myTexts = myTexts * 10
+        executor_map = concurrent.futures.ProcessPoolExecutor.map
+        # WHEN
+        with unittest.mock.patch.object(fex, "CHUNK_TEXTS", 1), \
+                unittest.mock.patch.object(concurrent.futures.ProcessPoolExecutor, "map", autospec=True,
+                                           side_effect=executor_map) as mocked:
+            parallel = fex.get_feature_list(myTexts, feats="words", n=1, freqsType="absolute", workers=2,
+                                            approx_capacity=100)
+        # THEN chunks are submitted a few at a time, with the same output
+        self.assertEqual(parallel, fex.get_feature_list(myTexts, feats="words", n=1, freqsType="absolute",
+                                                        approx_capacity=100))
+        self.assertEqual([len(call.args[2]) for call in mocked.call_args_list], [8, 8, 8, 6] * 2)
+
+        # THEN
+        with self.assertRaises(ValueError):
+            Config.from_kwargs(data_paths=self.paths, workers=0)
+
+
+    def test_get_feature_list_approx(self):
+        # FEATURE: bounded-memory approximate selection of the most frequent features
+        # GIVEN
+        myTexts = [
+            {"name": "Letter1", "aut": "Smith", "text": "This is the text", "lang": "en"},
+            {"name": "Letter2", "aut": "Smith", "text": "This is also the text", "lang": "en"},
+            {"name": "Letter1", "aut": "Dupont", "text": "Voici le texte", "lang": "fr"},
+        ]
+        fex = superstyl.preproc.features_extract
+        exact = fex.get_feature_list(myTexts[0:2], feats="chars", n=2, freqsType="absolute")
+        # WHEN
+        results = fex.get_feature_list(myTexts[0:2], feats="chars", n=2, freqsType="absolute",
+                                       approx_capacity=100)
+        # THEN
+        self.assertEqual(results, exact)
+
+        # GIVEN
+        myTexts = [
+            {"name": "Text1", "aut": "Smith", "text": "the cat and the dog and the bird", "lang": "en"},
+            {"name": "Text2", "aut": "Smith", "text": "the fish the cow the horse", "lang": "en"},
+            {"name": "Text3", "aut": "Dupont", "text": "a hen and the mouse", "lang": "en"},
+        ]
+        exact = fex.get_feature_list(myTexts, feats="words", n=1, freqsType="absolute")
+        # WHEN
+        results = fex.get_feature_list(myTexts, feats="words", n=1, freqsType="absolute", approx_capacity=3)
+        # THEN the most frequent are kept, with exact counts
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], ('the', 7))
+        self.assertTrue(all(dict(exact)[f] == v for f, v in results))
+
+        # WHEN
+        results = fex.get_feature_list(myTexts, feats="words", n=1, freqsType="absolute", approx_capacity=3,
+                                       exact_pass=False)
+        # THEN counts are overestimated, within bounds
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], ('the', 7))
+        self.assertTrue(all(v >= dict(exact).get(f, 0) for f, v in results))
+
+        # WHEN loading a corpus with an approximate vocabulary
+        cache = fex.CountCache()
+        corpus, feat_list = superstyl.load._load_single_feature(
+            [dict(t) for t in myTexts], FeatureConfig(type="words", n=1, k=2, freq_type="absolute", approx_vocab=1),
+            cache=cache)
+        # THEN only the selected features are counted, and full counts of documents are not kept
+        self.assertEqual(feat_list[0], ('the', 7))
+        self.assertEqual(list(corpus.columns), [f for f, _ in feat_list])
+        self.assertEqual(corpus.loc["Text1", "the"], 3)
+        self.assertEqual(cache._counts, {})
+
+    def test_space_saving(self):
+        # GIVEN
+        summary = superstyl.preproc.features_extract.SpaceSaving(3)
+        # WHEN
+        summary.update({'a': 5, 'b': 1, 'c': 1})
+        summary.update({'d': 1, 'a': 2})
+        summary.update({'e': 1})
+        # THEN
+        self.assertEqual(len(summary.counts), 3)
+        self.assertEqual(summary.counts['a'], 7)
+        self.assertEqual(summary.errors['a'], 0)
+        self.assertTrue(all(summary.counts[f] - summary.errors[f] <= 1 for f in summary.counts if f != 'a'))
+        self.assertEqual(summary.max_error(), 1)
+        with self.assertRaises(ValueError):
+            superstyl.preproc.features_extract.SpaceSaving(0)
+
 
 class DataLoading(unittest.TestCase):
 
@@ -637,6 +1183,21 @@ class DataLoading(unittest.TestCase):
         expected_keeppunct = "քան զսակաւս ։ Ահա նշանագրեցի"
         self.assertEqual(results, expected_keeppunct)
 
+    def test_normalise_many(self):
+        # FEATURE: normalise a batch of texts, with a normaliser compiled once per set of options
+        # GIVEN
+        texts = [" Hello,  Mr. 𓀁, how are §§ you; doing? ſõ ❡", "Où est passé l'été?", "ASCII only", "",
+                 "Ça " * 100 + "va", "Some text, " * 20 + "with «Ça» ſõ"]
+        for norm_conf in [NormalizationConfig(), NormalizationConfig(keep_punct=True),
+                          NormalizationConfig(keep_sym=True), NormalizationConfig(no_ascii=True)]:
+            # WHEN
+            results = superstyl.preproc.utils.normalise_many(texts, norm_conf)
+            # THEN
+            self.assertEqual(results, [superstyl.preproc.pipe.normalise(text, norm_conf) for text in texts])
+            self.assertIs(superstyl.preproc.utils.get_normaliser(norm_conf),
+                          superstyl.preproc.utils.get_normaliser(NormalizationConfig(**norm_conf.to_dict())))
+        self.assertEqual(superstyl.preproc.utils.normalise_many(texts[1:2]), ["ou est passe l ete"])
+
     def test_detect_lang(self):
         french = "Bonjour, Monsieur, comment allez-vous?"
         # NB: it fails on that !!!
@@ -650,6 +1211,24 @@ class DataLoading(unittest.TestCase):
         self.assertEqual(superstyl.preproc.pipe.detect_lang(english), "en")
         self.assertEqual(superstyl.preproc.pipe.detect_lang(italian), "it")
 
+    def test_detect_lang_sample(self):
+        # SCENARIO: language of a long text is identified on a bounded, reproducible sample of it
+        # GIVEN
+        text = " ".join(["Il était une fois un roi et une reine qui étaient bien fâchés de n'avoir point d'enfants."] * 2000)
+        # WHEN
+        sample = superstyl.preproc.utils.lang_sample(text)
+        # THEN
+        self.assertLessEqual(len(sample), superstyl.preproc.utils.LANG_SAMPLE_CHARS)
+        self.assertEqual(sample, superstyl.preproc.utils.lang_sample(text))
+        self.assertEqual(superstyl.preproc.utils.lang_sample("short text"), "short text")
+
+        # WHEN
+        superstyl.preproc.utils._LANGS.clear()
+        results = [superstyl.preproc.utils.detect_lang(text) for _ in range(3)]
+        # THEN: detected once, then cached
+        self.assertEqual(results, ["fr"] * 3)
+        self.assertEqual(len(superstyl.preproc.utils._LANGS), 1)
+
     # Now, lower level features,
     # from features_extract
     def test_counts(self):
@@ -684,6 +1263,176 @@ class DataLoading(unittest.TestCase):
         expected = ({'_yo': 2, 'The': 1, 'ese': 1, 'se_': 1, 'yo_': 1, 'yo!': 1}, 10)
         self.assertEqual(results, expected)
 
+    def test_count_char_ngrams(self):
+        # Scenario: count char n-grams with integer keys, in order of first occurrence
+        # GIVEN
+        text = "These yo yo!"
+        # WHEN
+        results = superstyl.preproc.features_extract.count_features(text, feats="chars", n=3)
+        # THEN
+        self.assertEqual(list(results[0].items()), [('The', 1), ('hes', 1), ('ese', 1), ('se_', 1), ('e_y', 1),
+                                                    ('_yo', 2), ('yo_', 1), ('o_y', 1), ('yo!', 1)])
+
+        # GIVEN a large alphabet, so that n-grams can not be packed in integer keys
+        text = "".join(chr(c) for c in range(0x1F600, 0x1F650)) * 2 + " 𓀁"
+        # WHEN
+        results = superstyl.preproc.features_extract.count_char_ngrams(text, n=12)
+        # THEN
+        self.assertEqual(results[1], len(text) - 11)
+        self.assertEqual(results[0][text[0:12]], 2)
+        self.assertEqual(list(results[0])[-1], text[-12:])
+
+        # GIVEN a text shorter than n
+        # WHEN
+        results = superstyl.preproc.features_extract.count_features("yo", feats="chars", n=3)
+        # THEN
+        self.assertEqual(results, ({}, 0))
+
+    def test_count_token_ngrams(self):
+        # Scenario: count token n-grams as strings, or, in long and repetitive texts, with integer keys
+        # GIVEN
+        fex = superstyl.preproc.features_extract
+        tokens = fex.tokenize("the cat_the dog, the cat_the dog!")
+        # WHEN
+        ids, size = fex.token_ids(tokens)
+        # THEN
+        self.assertEqual(tokens, ['the', 'cat_the', 'dog', ',', 'the', 'cat_the', 'dog', '!'])
+        self.assertEqual(ids.dtype, numpy.int32)
+        self.assertEqual(ids.tolist(), [0, 1, 2, 3, 0, 1, 2, 4])
+        self.assertEqual(size, 5)
+
+        for packed in [{"PACKED_MIN_TOKENS": 10 ** 9}, {"PACKED_MIN_TOKENS": 0, "PACKED_MIN_REPEATS": 1}]:
+            with unittest.mock.patch.multiple(fex, **packed):
+                # WHEN
+                results = fex.count_token_ngrams_orders(tokens, [1, 2, 3, 9])
+            # THEN
+            self.assertEqual(list(results[1][0].items()), [('the_cat_the', 2), ('cat_the_dog', 2), ('dog_,', 1),
+                                                           (',_the', 1), ('dog_!', 1)])
+            self.assertEqual(results[1][1], 7)
+            self.assertEqual(results[2][0]['the_cat_the_dog'], 2)
+            self.assertEqual(results[3], ({}, 0))
+            self.assertEqual(results[0], (collections.Counter(tokens), 8))
+
+        # GIVEN any text
+        text = "Ça va? Oui, ça va… ²³ l'œuvre -- x_y"
+        # WHEN
+        tokens = superstyl.preproc.utils.wordpunct_tokenize(text)
+        # THEN
+        self.assertEqual(tokens, nltk.tokenize.wordpunct_tokenize(text))
+
+    def test_count_features_orders(self):
+        # Scenario: count several n-grams lengths in one pass, as with count_features for each
+        # GIVEN
+        text = "These yo yo! the cat the dog"
+        for feats in ["words", "chars", "affixes", "met_line"]:
+            # WHEN
+            results = superstyl.preproc.features_extract.count_features_orders(text, feats=feats, ns=[1, 2, 3])
+            # THEN
+            expected = [superstyl.preproc.features_extract.count_features(text, feats=feats, n=n) for n in [1, 2, 3]]
+            self.assertEqual(results, expected)
+            self.assertEqual([list(r[0]) for r in results], [list(e[0]) for e in expected])
+
+        # WHEN n is longer than the text
+        results = superstyl.preproc.features_extract.count_features_orders("yo", feats="chars", ns=[2, 3])
+        # THEN
+        self.assertEqual(results, [({'yo': 1}, 1), ({}, 0)])
+
+    def test_count_features_restricted(self):
+        # Scenario: count only the features of a list, as with count_features then filtering
+        # GIVEN
+        text = "These yo_yo yo! the cat the dog ǂǃ"
+        feat_list = ["yo", "yo_yo", "yo_yo_yo", "the_cat", "_th", "he_", "the", "e d", "ǂǃ", "zzz", "cat"]
+        feature_set = superstyl.preproc.features_extract.FeatureSet(feat_list)
+        for feats in ["words", "chars", "affixes", "met_line"]:
+            for n in [1, 2, 3]:
+                # WHEN
+                results = superstyl.preproc.features_extract.count_features_restricted(
+                    text, feats=feats, n=n, feature_set=feature_set)
+                # THEN
+                counts, total = superstyl.preproc.features_extract.count_features(text, feats=feats, n=n)
+                self.assertEqual(results, ({f: c for f, c in counts.items() if f in feat_list}, total))
+
+    def test_count_windows(self):
+        # Scenario: count overlapping windows incrementally, as with count_features on each window
+        # GIVEN
+        tokens = "the cat , the dog ! the cat and the bird".split()
+        windows = [(0, 5), (2, 7), (3, 8), (6, 11), (0, 3), (9, 11)]
+        for n in [1, 2, 3]:
+            # WHEN
+            results = superstyl.preproc.features_extract.count_windows(tokens, windows, n=n)
+            # THEN
+            self.assertEqual(results, [superstyl.preproc.features_extract.count_features(' '.join(tokens[s:e]), n=n)
+                                       if e - s >= n else ({}, 0) for s, e in windows])
+
+        # GIVEN: overlapping samples, with their windows over the normalised units of the document
+        config = Config.from_kwargs(sampling=True, size=3, step=1)
+        paths = sorted(glob.glob(THIS_DIR + "/testdata/*.txt"))
+        samples = superstyl.preproc.pipe.docs_to_samples(paths, config, keep_units=True)
+        # THEN: their texts are left out, to be made from their windows
+        texts = [superstyl.preproc.features_extract.document_text(sample) for sample in samples]
+        self.assertTrue(all(sample["text"] is None for sample in samples))
+        self.assertEqual(texts, [sample["text"] for sample in superstyl.preproc.pipe.docs_to_samples(paths, config)])
+
+        # WHEN
+        cache = superstyl.preproc.features_extract.CountCache()
+        cache.count_windows(samples, feats="words", n=[1, 2])
+        # THEN: counts are keyed by window (units, start, size), not by text
+        self.assertEqual(len(cache._counts), 2 * len(samples))
+        self.assertEqual({key[2] for key in cache._counts}, {(id(sample["units"].tokens), sample["units"].start, 3)
+                                                             for sample in samples})
+        self.assertEqual(cache.count_documents(samples, feats="words", n=[1, 2]),
+                         [superstyl.preproc.features_extract.count_features_orders(text, ns=[1, 2])
+                          for text in texts])
+
+    def test_count_affixes(self):
+        # Scenario: affixes, space affixes and punctuation n-grams, in order of first occurrence
+        # GIVEN
+        text = "Voici le texte, also\u00a0this!"
+        # WHEN
+        results = superstyl.preproc.features_extract.count_affixes(text, n=3)
+        # THEN
+        expected = [('Voi', 1), ('tex', 1), ('als', 1), ('thi', 1), ('ici', 1), ('xte', 1), ('lso', 1), ('his', 1),
+                    ('ci_', 1), ('_le', 1), ('le_', 1), ('_te', 1), ('te,', 1), ('e,_', 1), (',_a', 1), ('_al', 1),
+                    ('so_', 1), ('_th', 1), ('is!', 1)]
+        self.assertEqual(list(results[0].items()), expected)
+        self.assertEqual(results[1], len(text) - 2)
+
+    def test_count_matrix(self):
+        # Scenario: given texts with counts and a feature list, build the document-term matrix
+        # GIVEN
+        myTexts = [{'name': 'Letter1', 'wordCounts': {'the': 0.25, 'is': 0.25, 'This': 0.25}},
+                   {'name': 'Letter2', 'wordCounts': {}},
+                   {'name': 'Letter3', 'wordCounts': {'le': 1/3}, 'embedded': {'the': 0.5}}]
+        feat_list = ['is', 'the', 'le']
+        # WHEN
+        results = superstyl.preproc.text_count.count_matrix(myTexts, feat_list)
+        # THEN
+        expected = [[0.25, 0.25, 0], [0, 0, 0], [0, 0, 1/3]]
+        self.assertEqual(results.shape, (3, 3))
+        self.assertEqual(results.toarray().tolist(), expected)
+        self.assertEqual(results.toarray().tolist(),
+                         [superstyl.preproc.text_count.count_process((t, feat_list))[1] for t in myTexts])
+
+        # WHEN
+        results = superstyl.preproc.text_count.count_matrix(myTexts[2:], feat_list, embeddedFreqs=True)
+        # THEN
+        self.assertEqual(results.toarray().tolist(), [[0, 0.5, 0]])
+
+    def test_create_samples_windows(self):
+        # FEATURE: overlapping samples are windows over the tokens of the document, without copy
+        # GIVEN
+        tokens = ["a", "b", "c", "d", "e"]
+        sampling = SamplingConfig(enabled=True, size=3, step=1)
+        # WHEN
+        samples = superstyl.preproc.pipe.Sampler.create_samples(tokens, sampling)
+        # THEN
+        self.assertEqual([(s["start"], s["end"]) for s in samples], [(0, 3), (1, 4), (2, 5)])
+        self.assertEqual([list(s["text"]) for s in samples], [["a", "b", "c"], ["b", "c", "d"], ["c", "d", "e"]])
+        self.assertTrue(all(s["text"].tokens is tokens for s in samples))
+        self.assertEqual(samples[1]["text"], ["b", "c", "d"])
+        self.assertEqual((samples[1]["text"][-1], samples[1]["text"][:2]), ("d", ["b", "c"]))
+        self.assertEqual(' '.join(samples[2]["text"]), "c d e")
+
     def test_max_sampling(self):
         # FEATURE: randomly select a maximum number of samples by author/class
         # GIVEN
@@ -697,6 +1446,29 @@ class DataLoading(unittest.TestCase):
         # EXPECT
         self.assertEqual(len([text for text in results if text["aut"] == 'Smith']), 1)
 
+        # WHEN
+        results = [superstyl.preproc.pipe.max_sampling(myTexts, max_samples=1, seed=42) for _ in range(2)]
+        # THEN: the selection is reproducible, and grouped by author
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([text["aut"] for text in results[0]], ["Smith", "Dupont"])
+
+        # GIVEN: samples of the test corpus
+        paths = sorted(glob.glob(THIS_DIR + "/testdata/*.txt"))
+        config = Config.from_kwargs(size=2, units="words", format="txt", max_samples=2)
+        # WHEN
+        random.seed(1)
+        with unittest.mock.patch("superstyl.preproc.pipe.normalise",
+                                 side_effect=superstyl.preproc.pipe.normalise) as mocked:
+            results = superstyl.preproc.pipe.docs_to_samples(paths, config)
+        # THEN: samples are selected before being normalised
+        all_samples = superstyl.preproc.pipe.docs_to_samples(paths, Config.from_kwargs(size=2, units="words",
+                                                                                            format="txt"))
+        random.seed(1)
+        expected = superstyl.preproc.pipe.max_sampling(all_samples, max_samples=2)
+        self.assertEqual(results, expected)
+        # one normalisation per text, for tokenization, and one per selected sample
+        self.assertEqual(mocked.call_count, len(paths) + len(results))
+
 
 class Embed(unittest.TestCase):
     model = superstyl.preproc.embedding.load_embeddings(THIS_DIR+"/embed/test_embedding.wv.txt")
@@ -4,6 +4,8 @@ import os
 import pandas
 import tempfile
 import numpy as np
+import scipy.sparse
+import glob
 from unittest.mock import patch
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -103,6 +105,25 @@ class Main_svm(unittest.TestCase):
         self.assertEqual(results['final_predictions'].to_dict()["author"], expected_preds["author"])
 
 
+    def test_train_svm_sparse(self):
+        # SCENARIO: train a svm on a sparse corpus, without densifying it
+        # GIVEN
+        paths = sorted(glob.glob(THIS_DIR + "/testdata/*.txt"))
+        train, feats = superstyl.load_corpus(data_paths=paths, sparse=True)
+        dense_train, _ = superstyl.load_corpus(data_paths=paths)
+        # WHEN
+        results = superstyl.train_svm(train, train, final_pred=True)
+        dense_results = superstyl.train_svm(dense_train, dense_train, final_pred=True)
+        # THEN
+        self.assertTrue(scipy.sparse.issparse(train.matrix))
+        self.assertEqual(results["final_predictions"].to_dict()["author"],
+                         dense_results["final_predictions"].to_dict()["author"])
+
+        # WHEN
+        results = superstyl.train_svm(train, train, final_pred=False, balance="SMOTE")
+        # THEN
+        self.assertEqual(results["misattributions"].to_dict(), {'True': {}, 'Pred': {}})
+
     def test_plot_rolling(self):
         train = pandas.DataFrame({
             'author': {'Text_0-1000': 'A', 'Text_1000-2000': 'A', 'Text_2000-3000': 'B'},
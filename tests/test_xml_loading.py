@@ -1,7 +1,11 @@
 import unittest
+import unittest.mock
 import superstyl.preproc.pipe
+from superstyl.config import Config, CorpusConfig, FeatureConfig, SamplingConfig
+from lxml import etree
 import os
 import glob
+import tempfile
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -299,6 +303,90 @@ class XMLLoadingTests(unittest.TestCase):
         self.assertIn("DET", text)
         self.assertIn("VERB", text)
 
+    def test_units_streaming_matches_xslt(self):
+        # SCENARIO: units streamed with iterparse are the same as with the XSLT templates
+        # GIVEN: TEI and TXM files, including nested words and NOMpro words
+        with tempfile.TemporaryDirectory() as temp_dir:
+            nested_path = os.path.join(temp_dir, "Dupont_nested.xml")
+            with open(nested_path, 'w') as f:
+                f.write('<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>'
+                        '<l met="01.01"><w lemma="a" pos="P">out<seg>er<w>in\rner</w></seg><!-- c --></w> tail'
+                        '<l><w met="1">nested</w></l></l><w>lone</w><p><l><w>last</w></l></p>'
+                        '</body></text></TEI>')
+            for template, loader, path in [('tei_units', 'tei', self.tei_path), ('tei_units', 'tei', nested_path),
+                                           ('txm_units', 'txm', self.txm_path)]:
+                xslt = etree.XSLT(etree.XML(superstyl.preproc.pipe.XSLT_TEMPLATES[template]))
+                for units in ["verses", "words"]:
+                    for feats in ["words", "lemma", "pos", "met"]:
+                        # WHEN: Extracting units
+                        results = superstyl.preproc.pipe.LOADERS[loader].extract_units(path, units, feats)
+                        # THEN: The output is the same as the XSLT template
+                        expected = str(xslt(etree.parse(path), units=etree.XSLT.strparam(units),
+                                            feats=etree.XSLT.strparam(feats))).splitlines()
+                        self.assertEqual(results, expected)
+
+    def test_extract_layers(self):
+        # SCENARIO: Extract several layers of units from a single parse
+        for loader, path in [('tei', self.tei_path), ('txm', self.txm_path)]:
+            # GIVEN
+            layers = [("verses", "words"), ("words", "lemma"), ("words", "pos"), ("verses", "met_line")]
+            # WHEN
+            with unittest.mock.patch("superstyl.preproc.pipe.etree.iterparse",
+                                     side_effect=etree.iterparse) as mocked:
+                results = superstyl.preproc.pipe.LOADERS[loader].extract_layers(path, layers)
+            # THEN
+            self.assertEqual(mocked.call_count, 1)
+            expected = [superstyl.preproc.pipe.LOADERS[loader].extract_units(path, units, feats)
+                        for units, feats in layers]
+            self.assertEqual(results, expected)
+
+    def test_docs_to_samples_identify_lang_single_parse(self):
+        # SCENARIO: With language identification, samples and language come from a single parse
+        # GIVEN
+        config = Config.from_kwargs(format="tei", sampling=True, units="verses", size=1, identify_lang=True)
+        # WHEN
+        with unittest.mock.patch("superstyl.preproc.pipe.etree.iterparse",
+                                 side_effect=etree.iterparse) as mocked:
+            results = superstyl.preproc.pipe.docs_to_samples([self.tei_path], config)
+        # THEN
+        self.assertEqual(mocked.call_count, 1)
+        expected = superstyl.preproc.pipe.docs_to_samples(
+            [self.tei_path], Config.from_kwargs(format="tei", sampling=True, units="verses", size=1))
+        self.assertEqual([(r["name"], r["text"]) for r in results], [(e["name"], e["text"]) for e in expected])
+        self.assertTrue(all(r["lang"] != "NA" for r in results))
+
+
+    def test_load_layers_single_parse(self):
+        # SCENARIO: A config mixing words, lemma and pos features loads every layer from a single parse
+        # GIVEN
+        features = [FeatureConfig(type="words"), FeatureConfig(type="lemma"), FeatureConfig(type="pos")]
+        config = Config(corpus=CorpusConfig(format="tei"), features=features)
+        # WHEN
+        with unittest.mock.patch("superstyl.preproc.pipe.etree.iterparse",
+                                 side_effect=etree.iterparse) as mocked:
+            results = superstyl.preproc.pipe.load_texts([self.tei_path], config)
+        # THEN
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(superstyl.preproc.pipe.feature_layers(config), ["words", "lemma", "pos"])
+        for feats in ["words", "lemma", "pos"]:
+            expected = superstyl.preproc.pipe.load_texts([self.tei_path], Config.from_kwargs(format="tei", feats=feats))
+            self.assertEqual(results[0]["layers"][feats], expected[0]["text"])
+        self.assertEqual(results[0]["text"], results[0]["layers"]["words"])
+
+        # GIVEN: samples of verses
+        config = Config(corpus=CorpusConfig(format="tei"), features=features,
+                        sampling=SamplingConfig(enabled=True, units="verses", size=2))
+        # WHEN
+        with unittest.mock.patch("superstyl.preproc.pipe.etree.iterparse",
+                                 side_effect=etree.iterparse) as mocked:
+            results = superstyl.preproc.pipe.docs_to_samples([self.tei_path], config)
+        # THEN: each layer is sampled on the same verses
+        self.assertEqual(mocked.call_count, 1)
+        for feats in ["words", "lemma", "pos"]:
+            expected = superstyl.preproc.pipe.docs_to_samples(
+                [self.tei_path], Config.from_kwargs(format="tei", feats=feats, sampling=True, units="verses", size=2))
+            self.assertEqual([(r["name"], r["layers"][feats]) for r in results],
+                             [(e["name"], e["text"]) for e in expected])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file